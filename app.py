@@ -1,89 +1,687 @@
+import math
 import os
-from flask import Flask, request, jsonify
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Request, Response, request, jsonify, make_response, send_file
 from flask_cors import CORS
 from dotenv import load_dotenv
-from utils.audio_processor import AudioProcessor
-from utils.model_handler import ModelHandler
+from werkzeug.exceptions import RequestEntityTooLarge
+from utils.audio_processor import AudioProcessor, sniff_format
+from utils.model_registry import ModelRegistry, ModelManager
+from utils.cascade import classify_analyses
+from utils.result_cache import ResultCache
+from utils.fingerprint_index import FingerprintIndex, acoustic_fingerprint
+from utils.segment_scorer import SegmentScorer, window_samples
+from utils.job_queue import JobManager, QueueFull
+from utils.admission import AdmissionController, Rejected
+from utils.profiler import ProfileStore
+from utils import metrics
 
 # Load environment variables
 load_dotenv()
 
+class _UploadRequest(Request):
+    """Lets werkzeug enforce MAX_UPLOAD_BYTES while it parses a multipart body, which it otherwise
+    reads in full before request.files returns (chunked uploads carry no Content-Length to check).
+    JSON and raw bodies keep their own limits.
+    """
+
+    @property
+    def max_content_length(self):
+        if self.mimetype == 'multipart/form-data':
+            return MAX_UPLOAD_BYTES
+        return super().max_content_length
+
 app = Flask(__name__)
+app.request_class = _UploadRequest
 CORS(app)
 
 # Initialize components
-processor = AudioProcessor()
-model_handler = ModelHandler()
+# Under gunicorn's preload_app (see gunicorn.conf.py) this runs once in the master and the
+# workers share the model pages copy-on-write; compiled models are memory-mapped as well
+processor = AudioProcessor(resample_quality=os.getenv('RESAMPLE_QUALITY', 'soxr_hq'),
+                           vad=os.getenv('VAD_ENABLED', '0') == '1',
+                           ffmpeg_pool_size=int(os.getenv('FFMPEG_POOL_SIZE', 0)))
+# Serves the registry's CURRENT version (or the loose models/*.pkl files) and hot-swaps new versions
+model_registry = ModelRegistry(os.getenv('MODEL_REGISTRY_DIR', 'models/registry'))
+model_manager = ModelManager(
+    model_registry,
+    mmap_mode='r' if os.getenv('MODEL_MMAP', '1') == '1' else None,
+    poll_interval=float(os.getenv('MODEL_POLL_SECONDS', 5)),
+    shadow_sample_rate=float(os.getenv('SHADOW_SAMPLE_RATE', 0))
+)
 
 # Configuration
 API_KEY = os.getenv('API_KEY', 'guvi_ai_voice_secret_key')
+# Load testing only: 'decode' answers right after decoding, 'features' after feature extraction
+STUB_MODEL = os.getenv('STUB_MODEL', '')
+# Admin endpoints are disabled unless ADMIN_API_KEY is set
+ADMIN_API_KEY = os.getenv('ADMIN_API_KEY')
+# 'memory' decodes uploads in RAM via ffmpeg pipes; 'disk' keeps the legacy temp_audio round-trip
+DECODE_MODE = os.getenv('AUDIO_DECODE_MODE', 'memory')
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 64))
+# Upper bound for raw (application/octet-stream, audio/*) and multipart uploads
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 50 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', os.cpu_count() or 1))
+# First-stage confidence at which the cascade returns early; CASCADE_ENABLED=0 always runs the full model
+CASCADE_THRESHOLD = float(os.getenv('CASCADE_THRESHOLD', 0.9)) if os.getenv('CASCADE_ENABLED', '1') == '1' else None
 
-@app.route('/', methods=['GET'])
-def index():
-    """Root endpoint with API information"""
-    return jsonify({
+# Threads are started lazily on first use; ffmpeg runs out of process and numpy releases the GIL
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+
+# In-process LRU per worker, plus an optional directory shared by all gunicorn workers
+result_cache = ResultCache(
+    max_entries=int(os.getenv('RESULT_CACHE_SIZE', 1024)),
+    disk_dir=os.getenv('RESULT_CACHE_DIR') or None,
+    # Results of models no worker has written for this long are deleted from the disk tier
+    disk_max_age=float(os.getenv('RESULT_CACHE_DISK_MAX_AGE', 3600))
+)
+
+# Created before gunicorn forks, so the rate limits, in-flight count and cost estimates are shared by all workers
+admission = AdmissionController(
+    [API_KEY],
+    rate_per_key=float(os.getenv('RATE_LIMIT_PER_SECOND', 0)),
+    burst=float(os.getenv('RATE_LIMIT_BURST', 0)) or None,
+    max_in_flight=int(os.getenv('MAX_IN_FLIGHT', 0)),
+    # Requests served at once; under gunicorn, when_ready sets workers x threads unless ADMISSION_CAPACITY is given
+    capacity=int(os.getenv('ADMISSION_CAPACITY',
+                           int(os.getenv('WEB_CONCURRENCY', 4)) * int(os.getenv('GUNICORN_THREADS', 1)))),
+    default_deadline=float(os.getenv('DEFAULT_DEADLINE_SECONDS', 60))
+)
+
+# Opt-in cProfile captures of single /detect requests: X-Profile: 1 with the admin key, or sampled
+profile_store = ProfileStore(
+    directory=os.getenv('PROFILE_DIR', 'profiles'),
+    max_captures=int(os.getenv('PROFILE_MAX_CAPTURES', 50)),
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+)
+
+# Per-worker index of acoustic fingerprints: catches transcoded or trimmed copies the byte-level cache misses.
+# Off by default: a voice-converted copy of an indexed clip keeps its timing and loudness contour, so only
+# enable it where reused verdicts for acoustically similar uploads are acceptable
+fingerprint_index = FingerprintIndex(
+    max_entries=int(os.getenv('FINGERPRINT_INDEX_SIZE', 0)),
+    threshold=float(os.getenv('FINGERPRINT_THRESHOLD', 0.9))
+)
+
+# Long clips run on a bounded process pool instead of tying up the request worker.
+# JOB_QUEUE_DEPTH is shared by all gunicorn workers; each worker starts its own pool of
+# JOB_PROCESSES_PER_WORKER model-loading processes, so the total is that times WEB_CONCURRENCY
+job_manager = JobManager(
+    job_dir=os.getenv('JOB_DIR', 'jobs'),
+    max_workers=int(os.getenv('JOB_PROCESSES_PER_WORKER', 1)),
+    max_queue=int(os.getenv('JOB_QUEUE_DEPTH', 16)),
+    timeout=float(os.getenv('JOB_TIMEOUT_SECONDS', 600))
+)
+
+def api_info():
+    """Endpoint listing, shared with the ASGI entry point (asgi_app.py)"""
+    return {
         "name": "AI Voice Detection API",
         "status": "online",
         "endpoints": {
             "health": "/health (GET)",
-            "detect": "/detect (POST)"
+            "detect": "/detect (POST: JSON base64, application/octet-stream or multipart/form-data)",
+            "detect_batch": "/detect/batch (POST)",
+            "detect_stream": "/detect/stream (POST: application/octet-stream, audio/* or multipart streamed; JSON base64)",
+            "jobs": "/jobs (POST), /jobs/<job_id> (GET, DELETE)",
+            "metrics": "/metrics (GET)",
+            "admin_models": "/admin/models (GET, POST)",
+            "admin_profiles": "/admin/profiles (GET), /admin/profiles/<request_id> (GET)"
         }
-    }), 200
+    }
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Check API health and status"""
-    model_loaded = model_handler.model is not None
-    scaler_loaded = model_handler.scaler is not None
-    
-    return jsonify({
+def health_status():
+    """Health payload, shared with the ASGI entry point (asgi_app.py)"""
+    model_handler = model_manager.active
+    model_loaded = model_handler.model is not None or model_handler.compiled is not None
+    scaler_loaded = model_handler.scaler is not None or model_handler.compiled is not None
+
+    return {
         "status": "success",
         "message": "AI Voice Detection API is running",
         "version": "1.0.0",
         "checks": {
             "model_loaded": model_loaded,
-            "scaler_loaded": scaler_loaded
-        }
-    }), 200
+            "scaler_loaded": scaler_loaded,
+            "compiled_model": model_handler.compiled is not None
+        },
+        "model": {
+            "version": model_handler.version,
+            "shadow_version": model_manager.shadow.version if model_manager.shadow is not None else None,
+            "size_bytes": model_handler.size_bytes,
+            "memory_mapped": model_handler.compiled is not None and model_handler.compiled.mmap_mode is not None,
+            "load_time_ms": model_handler.load_time_ms,
+            "feature_families": model_handler.feature_families or "all"
+        },
+        "process": _process_memory()
+    }
+
+@app.route('/', methods=['GET'])
+def index():
+    """Root endpoint with API information"""
+    return jsonify(api_info()), 200
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Check API health and status"""
+    return jsonify(health_status()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics aggregated across gunicorn workers"""
+    payload, content_type = metrics.render()
+    return Response(payload, status=200, content_type=content_type)
+
+def _process_memory():
+    """Resident memory of this worker; shared_bytes counts file-backed/shared pages such as the mmapped model."""
+    fields = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'RssFile', 'RssShmem'):
+                    fields[key] = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        return {"pid": os.getpid()}
+
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": fields.get('VmRSS'),
+        "shared_bytes": fields.get('RssFile', 0) + fields.get('RssShmem', 0)
+    }
+
+def _is_authorized():
+    auth_header = request.headers.get('X-API-KEY')
+    return bool(auth_header) and auth_header == API_KEY
+
+def _is_admin():
+    auth_header = request.headers.get('X-ADMIN-KEY')
+    return bool(ADMIN_API_KEY) and auth_header == ADMIN_API_KEY
+
+def _analyze(audio_data):
+    """Decodes one uploaded clip and returns its lazy ClipAnalysis; features are computed on demand."""
+    if DECODE_MODE == 'memory':
+        with metrics.track_stage('conversion'):
+            y = processor.bytes_to_array(audio_data)
+    else:
+        paths_to_cleanup = []
+        try:
+            with metrics.track_stage('conversion'):
+                wav_path, mp3_path = processor.bytes_to_wav(audio_data)
+                paths_to_cleanup.extend([wav_path, mp3_path])
+                y, _ = processor.load_file(wav_path)
+        finally:
+            processor.cleanup(paths_to_cleanup)
+
+    metrics.INPUT_DURATION.observe(len(y) / processor.sample_rate)
+    return processor.analyze(y, processor.sample_rate)
+
+def _read_limited(stream, limit):
+    """Reads a body stream in chunks; returns None once it exceeds limit bytes."""
+    buffer = bytearray()
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            return bytes(buffer)
+        buffer.extend(chunk)
+        if len(buffer) > limit:
+            return None
+
+class _LimitedReader:
+    """Read-only view of an upload stream that ends the body after limit bytes and records that it
+    did, so a streaming decoder can consume the request directly.
+    """
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.read_bytes = 0
+        self.exceeded = False
+
+    def read(self, size=-1):
+        if self.exceeded:
+            return b''
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(UPLOAD_CHUNK_BYTES), b''))
+        chunk = self.stream.read(size)
+        self.read_bytes += len(chunk)
+        if self.read_bytes > self.limit:
+            self.exceeded = True
+            return b''
+        return chunk
+
+def _read_audio_upload():
+    """Returns (audio_data, None) or (None, error response).
+    Accepts a JSON body with base64 'audio', a raw application/octet-stream or audio/* body,
+    or a multipart/form-data upload in the 'audio' field.
+    """
+    mimetype = request.mimetype
+    is_raw = mimetype == 'application/octet-stream' or mimetype.startswith('audio/')
+    if is_raw or mimetype == 'multipart/form-data':
+        if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+            return None, (jsonify({"error": f"Upload exceeds {MAX_UPLOAD_BYTES} bytes"}), 413)
+
+        if is_raw:
+            stream = request.stream
+        else:
+            try:
+                upload = request.files.get('audio')
+            except RequestEntityTooLarge:
+                return None, (jsonify({"error": f"Upload exceeds {MAX_UPLOAD_BYTES} bytes"}), 413)
+            if upload is None:
+                return None, (jsonify({"error": "Missing audio file in multipart field 'audio'"}), 400)
+            stream = upload.stream
+
+        with metrics.track_stage('upload'):
+            audio_data = _read_limited(stream, MAX_UPLOAD_BYTES)
+        if audio_data is None:
+            return None, (jsonify({"error": f"Upload exceeds {MAX_UPLOAD_BYTES} bytes"}), 413)
+        if not audio_data:
+            return None, (jsonify({"error": "Empty audio upload"}), 400)
+        return audio_data, None
+
+    data = request.get_json(silent=True)
+    if not data or 'audio' not in data:
+        return None, (jsonify({"error": "Missing audio data in base64 format"}), 400)
+
+    with metrics.track_stage('decode'):
+        return processor.decode_base64(data['audio']), None
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"Upload exceeds {MAX_UPLOAD_BYTES} bytes"}), 413
+
+def _rejection(e):
+    metrics.ADMISSION_REJECTIONS.labels(reason=e.reason).inc()
+    return jsonify({"error": str(e)}), e.status, {"Retry-After": str(e.retry_after)}
+
+def _extract_batch_item(item):
+    """Returns (analysis, error) so that one bad clip does not fail the whole batch."""
+    try:
+        with metrics.track_stage('decode'):
+            audio_data = processor.decode_base64(item)
+        return _analyze(audio_data), None
+    except Exception as e:
+        return None, str(e)
+
+def _score_shadow(shadow, analysis, result):
+    """Scores a sampled request on the candidate model; never affects the response."""
+    try:
+        predictions, error = shadow.predict_batch(analysis.vector(shadow.feature_families))
+        if error:
+            metrics.SHADOW_PREDICTIONS.labels(outcome="error").inc()
+            print(f"Shadow {shadow.version} error: {error}")
+            return
+        prediction = predictions[0]
+        outcome = "agree" if prediction["classification"] == result["classification"] else "disagree"
+        metrics.SHADOW_PREDICTIONS.labels(outcome=outcome).inc()
+        print(f"Shadow {shadow.version}: {prediction['classification']} ({prediction['confidence']}) "
+              f"vs {result['model_version']}: {result['classification']} ({result['confidence']})")
+    except Exception as e:
+        metrics.SHADOW_PREDICTIONS.labels(outcome="error").inc()
+        print(f"Shadow {shadow.version} error: {str(e)}")
 
 @app.route('/detect', methods=['POST'])
+@metrics.track_request('detect')
 def detect_voice():
     """Main endpoint to detect AI vs Human voice"""
+    forced = request.headers.get('X-Profile') == '1' and _is_admin()
+    if not profile_store.should_profile(forced):
+        return _detect_voice()
+
+    request_id = profile_store.request_id(request.headers.get('X-Request-ID'))
+    with profile_store.capture(request_id, "header" if forced else "sampled") as capture:
+        response = make_response(_detect_voice(capture))
+        if capture is not None:
+            capture["status"] = response.status_code
+            response.headers["X-Profile-Id"] = request_id
+    return response
+
+def _detect_voice(capture=None):
+    """The /detect pipeline; capture is the metadata dict of a running profile, if any"""
     # 1. Authentication
-    auth_header = request.headers.get('X-API-KEY')
-    if not auth_header or auth_header != API_KEY:
+    if not _is_authorized():
         return jsonify({"error": "Unauthorized"}), 401
 
-    # 2. Validation
-    data = request.get_json()
-    if not data or 'audio' not in data:
-        return jsonify({"error": "Missing audio data in base64 format"}), 400
-    
-    base64_audio = data['audio']
-    paths_to_cleanup = []
+    # Admission: per-key rate limit, in-flight cap and estimated queue wait against the deadline
+    started = time.monotonic()
+    deadline = admission.deadline(request.headers.get('X-Request-Deadline'), request.headers.get('X-Request-Start'))
+    try:
+        admission.admit(request.headers.get('X-API-KEY'), deadline)
+    except Rejected as e:
+        return _rejection(e)
+
+    # One handler for the whole request, even if a new version is swapped in meanwhile
+    model_handler = model_manager.active
+    shadow = model_manager.shadow if model_manager.should_shadow() else None
 
     try:
-        # 3. Audio Processing (Decode & Convert)
-        wav_path, mp3_path = processor.base64_to_wav(base64_audio)
-        paths_to_cleanup.extend([wav_path, mp3_path])
+        # 2. Validation & 3. Read/decode upload
+        audio_data, error_response = _read_audio_upload()
+        if error_response:
+            return error_response
+
+        # Serve repeated submissions from the cache
+        audio_key = result_cache.audio_key(audio_data) if result_cache.enabled else None
+        if audio_key:
+            cached = result_cache.get(audio_key, model_handler.fingerprint)
+            metrics.CACHE_LOOKUPS.labels(result="miss" if cached is None else "hit").inc()
+            if cached is not None:
+                cached["cache"] = "hit"
+                cached["near_duplicate"] = False
+                return jsonify(cached), 200
+
+        if capture is not None:
+            capture.update({"upload_bytes": len(audio_data), "format": sniff_format(audio_data),
+                            "content_type": request.content_type})
+
+        # 4. Audio Processing (Convert)
+        analysis = _analyze(audio_data)
 
-        # 4. Feature Extraction
-        features = processor.extract_features(wav_path)
+        # Shed the clip before the expensive stages if it can no longer finish in time
+        audio_seconds = len(analysis.y) / analysis.sr
+        if capture is not None:
+            capture.update({"analyzed_seconds": round(audio_seconds, 3), "speech_seconds": analysis.speech_duration})
 
-        # 5. Inference
-        result, error = model_handler.predict(features)
-        
+        # Reuse the verdict of a recent near-duplicate (re-encoded, transcoded or slightly trimmed)
+        fingerprint = None
+        if fingerprint_index.enabled and not STUB_MODEL:
+            with metrics.track_stage('fingerprint'):
+                fingerprint = acoustic_fingerprint(analysis)
+                match = fingerprint_index.lookup(fingerprint, audio_seconds, model_handler.fingerprint) \
+                    if fingerprint is not None else None
+            metrics.NEAR_DUPLICATE_LOOKUPS.labels(result="miss" if match is None else "hit").inc()
+            if match is not None:
+                result, similarity = match
+                result.update({"near_duplicate": True, "similarity": round(similarity, 4), "cache": "near_duplicate"})
+                return jsonify(result), 200
+
+        admission.check_processing(audio_seconds, deadline - (time.monotonic() - started))
+
+        if STUB_MODEL:
+            if STUB_MODEL == 'features':
+                with metrics.track_stage('features'):
+                    analysis.vector()
+            return jsonify({"classification": "HUMAN", "confidence": 0.5, "stage": "stub"}), 200
+
+        # 5. Feature Extraction & Inference, exiting after the cheap first stage when it is confident
+        results, error = classify_analyses(model_handler, [analysis], CASCADE_THRESHOLD)
         if error:
             return jsonify({"error": error}), 500
 
+        admission.record(time.monotonic() - started, audio_seconds)
+        result = results[0]
+        result["model_version"] = model_handler.version
+        if capture is not None:
+            capture.update({"stage": result["stage"], "model_version": model_handler.version})
+        if audio_key:
+            result_cache.put(audio_key, model_handler.fingerprint, result)
+        if fingerprint is not None:
+            fingerprint_index.add(fingerprint, audio_seconds, model_handler.fingerprint, result)
+        result["cache"] = "miss"
+        result["near_duplicate"] = False
+
+        if shadow is not None:
+            batch_executor.submit(_score_shadow, shadow, analysis, dict(result))
+
         return jsonify(result), 200
 
+    except Rejected as e:
+        return _rejection(e)
     except Exception as e:
         return jsonify({"error": f"Internal process error: {str(e)}"}), 500
-    
     finally:
-        # 6. Cleanup
-        processor.cleanup(paths_to_cleanup)
+        admission.release()
+
+@app.route('/detect/batch', methods=['POST'])
+@metrics.track_request('detect_batch')
+def detect_batch():
+    """Scores a list of base64 clips with a single vectorized inference call"""
+    # 1. Authentication
+    if not _is_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # 2. Validation - items are base64 strings or {"id": ..., "audio": ...} objects
+    data = request.get_json(silent=True)
+    items = data.get('audios') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Missing list of base64 audio clips in 'audios'"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Batch too large: at most {BATCH_MAX_ITEMS} clips per request"}), 413
+
+    ids = []
+    clips = []
+    for index, item in enumerate(items):
+        if isinstance(item, dict):
+            ids.append(item.get('id', index))
+            clips.append(item.get('audio'))
+        else:
+            ids.append(index)
+            clips.append(item)
+
+    model_handler = model_manager.active
+    results = [{"id": item_id} for item_id in ids]
+    try:
+        # 3. Decode in parallel
+        extracted = list(batch_executor.map(_extract_batch_item, clips))
+
+        analyses = []
+        row_indices = []
+        for index, (analysis, error) in enumerate(extracted):
+            if error:
+                results[index]["error"] = f"Internal process error: {error}"
+            else:
+                analyses.append(analysis)
+                row_indices.append(index)
+
+        # 4. Features in parallel, one vectorized inference call per cascade stage
+        if analyses:
+            predictions, error = classify_analyses(model_handler, analyses, CASCADE_THRESHOLD,
+                                                   executor=batch_executor)
+            if error:
+                return jsonify({"error": error}), 500
+            for index, prediction in zip(row_indices, predictions):
+                results[index].update(prediction)
+
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "failed": len(results) - len(row_indices),
+            "model_version": model_handler.version
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Internal process error: {str(e)}"}), 500
+
+@app.route('/detect/stream', methods=['POST'])
+@metrics.track_request('detect_stream')
+def detect_stream():
+    """Sliding-window detection for long recordings, with per-segment scores"""
+    # 1. Authentication
+    if not _is_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # 2. Validation - raw and multipart bodies are decoded straight from the request stream, so peak
+    # memory stays flat however long the recording; JSON base64 is kept for compatibility
+    mimetype = request.mimetype
+    is_raw = mimetype == 'application/octet-stream' or mimetype.startswith('audio/')
+    upload = None
+    if is_raw or mimetype == 'multipart/form-data':
+        if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+            return jsonify({"error": f"Upload exceeds {MAX_UPLOAD_BYTES} bytes"}), 413
+        if is_raw:
+            params = request.args
+            upload = _LimitedReader(request.stream, MAX_UPLOAD_BYTES)
+        else:
+            params = request.form
+            if request.files.get('audio') is None:
+                return jsonify({"error": "Missing audio file in multipart field 'audio'"}), 400
+            upload = _LimitedReader(request.files['audio'].stream, MAX_UPLOAD_BYTES)
+    else:
+        params = request.get_json(silent=True)
+        if not params or 'audio' not in params:
+            return jsonify({"error": "Missing audio data in base64 format"}), 400
+
+    model_handler = model_manager.active
+    try:
+        scorer = SegmentScorer(
+            processor, model_handler,
+            window=float(params.get('window', 1.0)),
+            overlap=float(params.get('overlap', 0.5))
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # 3. Decode in blocks, score each window, aggregate
+        source = upload if upload is not None else processor.decode_base64(params['audio'])
+        result = scorer.score(source)
+        error = None
+    except Exception as e:
+        result, error = None, str(e)
+
+    if upload is not None and upload.exceeded:
+        return jsonify({"error": f"Upload exceeds {MAX_UPLOAD_BYTES} bytes"}), 413
+    if upload is not None and upload.read_bytes == 0:
+        return jsonify({"error": "Empty audio upload"}), 400
+    if error:
+        return jsonify({"error": f"Internal process error: {error}"}), 500
+
+    result["model_version"] = model_handler.version
+    return jsonify(result), 200
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queues a detection job and returns its id immediately"""
+    # 1. Authentication
+    if not _is_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # 2. Validation
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'audio' not in data:
+        return jsonify({"error": "Missing audio data in base64 format"}), 400
+
+    timeout = data.get('timeout')
+    if timeout is not None:
+        try:
+            timeout = float(timeout)
+        except (TypeError, ValueError):
+            timeout = None
+        if timeout is None or not math.isfinite(timeout) or timeout <= 0:
+            return jsonify({"error": "timeout must be a positive number of seconds"}), 400
+
+    mode = data.get('mode', 'detect')
+    if mode not in ('detect', 'segments'):
+        return jsonify({"error": "mode must be 'detect' or 'segments'"}), 400
+    options = {}
+    if mode == 'segments':
+        try:
+            options = {
+                "window": float(data.get('window', 1.0)),
+                "overlap": float(data.get('overlap', 0.5))
+            }
+        except (TypeError, ValueError):
+            return jsonify({"error": "window and overlap must be numbers"}), 400
+        # Rejected here rather than failing in the job process after queueing
+        try:
+            window_samples(options["window"], options["overlap"], processor.sample_rate)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    try:
+        audio_data = processor.decode_base64(data['audio'])
+        record = job_manager.submit(audio_data, mode=mode, options=options, timeout=timeout)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    except Exception as e:
+        return jsonify({"error": f"Internal process error: {str(e)}"}), 500
+
+    record["status_url"] = f"/jobs/{record['job_id']}"
+    return jsonify(record), 202
+
+@app.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+def job_status(job_id):
+    """Reports the status and result of a job, or cancels it"""
+    # 1. Authentication
+    if not _is_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    if request.method == 'DELETE':
+        record = job_manager.cancel(job_id)
+    else:
+        record = job_manager.get(job_id)
+
+    if record is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(record), 200
+
+@app.route('/admin/models', methods=['GET', 'POST'])
+def admin_models():
+    """Lists registry versions, or promotes a version / sets the shadow candidate"""
+    # 1. Authentication
+    if not _is_admin():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    if request.method == 'GET':
+        return jsonify({
+            "versions": [dict(model_registry.metadata(version), version=version)
+                         for version in model_registry.versions()],
+            **model_manager.status(),
+            "admission": admission.status(),
+            "fingerprint_index": fingerprint_index.status()
+        }), 200
+
+    # 2. Validation
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or ('version' not in data and 'shadow' not in data):
+        return jsonify({"error": "Provide 'version' to promote and/or 'shadow' (null to clear)"}), 400
+    for key in ('version', 'shadow'):
+        if data.get(key) is not None and not isinstance(data[key], str):
+            return jsonify({"error": f"'{key}' must be a version string"}), 400
+        if data.get(key) is not None and not model_registry.exists(data[key]):
+            return jsonify({"error": f"Unknown model version: {data[key]}"}), 404
+
+    # 3. Point the registry at the new versions; every worker (and job process) picks it up on its
+    # next poll, this one starts loading right away
+    if data.get('version') is not None:
+        model_registry.set_current(data['version'])
+        model_manager.reload_async(data['version'])
+    if 'shadow' in data:
+        model_registry.set_shadow(data['shadow'])
+        if data['shadow'] is not None:
+            model_manager.reload_async(data['shadow'], shadow=True)
+        else:
+            model_manager.shadow = None
+
+    return jsonify({"status": "loading", **model_manager.status()}), 202
+
+@app.route('/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """Lists recent per-request profile captures"""
+    # 1. Authentication
+    if not _is_admin():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({"profiles": profile_store.list(limit), "sample_rate": profile_store.sample_rate}), 200
+
+@app.route('/admin/profiles/<request_id>', methods=['GET'])
+def admin_profile(request_id):
+    """Returns one capture's summary, or with ?format=prof the raw cProfile file"""
+    # 1. Authentication
+    if not _is_admin():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    metadata, prof_path = profile_store.get(request_id)
+    if metadata is None:
+        return jsonify({"error": "Profile not found"}), 404
+    if request.args.get('format') == 'prof':
+        return send_file(os.path.abspath(prof_path), mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f"{metadata['request_id']}.prof")
+    return jsonify(metadata), 200
 
 if __name__ == '__main__':
     # Ensure directories exist
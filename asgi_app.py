@@ -0,0 +1,327 @@
+"""Async entry point with the same /, /health and /detect contract as app.py.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 4
+
+Request bodies are read and ffmpeg decodes are awaited on the event loop, so slow uploads and
+subprocess waits no longer hold a worker; feature extraction and inference run on a bounded
+executor. Every request has a deadline, and requests beyond the executor's queue depth are
+rejected with 503 instead of piling up.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+import app as wsgi_app
+from utils.audio_processor import SNDFILE_FORMATS, sniff_format
+from utils.cascade import classify_analyses
+from utils.fingerprint_index import acoustic_fingerprint
+from utils import metrics
+
+# 'thread' shares the loaded model; 'process' sidesteps the GIL for the Python parts of feature extraction
+EXECUTOR_KIND = os.getenv('ASGI_EXECUTOR', 'thread')
+CPU_WORKERS = int(os.getenv('ASGI_CPU_WORKERS', os.cpu_count() or 1))
+# Requests waiting for or running on the executor; further ones get 503
+CPU_QUEUE_DEPTH = int(os.getenv('ASGI_CPU_QUEUE_DEPTH', CPU_WORKERS * 4))
+# Whole-request deadline, upload included
+REQUEST_TIMEOUT = float(os.getenv('ASGI_REQUEST_TIMEOUT', 30))
+# A base64 JSON body is a third larger than the upload it carries
+MAX_JSON_BYTES = wsgi_app.MAX_UPLOAD_BYTES * 4 // 3 + 64 * 1024
+
+if EXECUTOR_KIND == 'process':
+    # Spawned workers import this module and load their own model
+    cpu_executor = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+else:
+    cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS)
+
+_pending = 0
+
+
+class RequestError(Exception):
+    """A client error that maps straight to an HTTP status."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _detect(audio_data, y=None):
+    """Decode (unless the event loop already did), features and inference for one clip; runs on cpu_executor."""
+    processor = wsgi_app.processor
+    model_handler = wsgi_app.model_manager.active
+    if y is None:
+        analysis = wsgi_app._analyze(audio_data)
+    else:
+        metrics.INPUT_DURATION.observe(len(y) / processor.sample_rate)
+        analysis = processor.analyze(y, processor.sample_rate)
+
+    if wsgi_app.STUB_MODEL:
+        if wsgi_app.STUB_MODEL == 'features':
+            with metrics.track_stage('features'):
+                analysis.vector()
+        return {"classification": "HUMAN", "confidence": 0.5, "stage": "stub"}, None
+
+    fingerprint_index = wsgi_app.fingerprint_index
+    audio_seconds = len(analysis.y) / analysis.sr
+    fingerprint = None
+    if fingerprint_index.enabled:
+        with metrics.track_stage('fingerprint'):
+            fingerprint = acoustic_fingerprint(analysis)
+            match = fingerprint_index.lookup(fingerprint, audio_seconds, model_handler.fingerprint) \
+                if fingerprint is not None else None
+        metrics.NEAR_DUPLICATE_LOOKUPS.labels(result="miss" if match is None else "hit").inc()
+        if match is not None:
+            result, similarity = match
+            result.update({"near_duplicate": True, "similarity": round(similarity, 4)})
+            return result, None
+
+    results, error = classify_analyses(model_handler, [analysis], wsgi_app.CASCADE_THRESHOLD)
+    if error:
+        return None, error
+
+    result = results[0]
+    result["model_version"] = model_handler.version
+    if fingerprint is not None:
+        fingerprint_index.add(fingerprint, audio_seconds, model_handler.fingerprint, result)
+    if wsgi_app.model_manager.should_shadow():
+        wsgi_app.batch_executor.submit(wsgi_app._score_shadow, wsgi_app.model_manager.shadow, analysis, dict(result))
+    return result, None
+
+
+async def _run_cpu(fn, *args):
+    """Runs fn on cpu_executor. A request that times out while still queued never starts; one that
+    is already running keeps its slot until it finishes, so the queue depth reflects real work.
+    """
+    global _pending
+    if _pending >= CPU_QUEUE_DEPTH:
+        raise RequestError(503, "Server busy, retry later", {"Retry-After": "1"})
+
+    loop = asyncio.get_running_loop()
+
+    def release(_):
+        global _pending
+        _pending -= 1
+
+    _pending += 1
+    future = cpu_executor.submit(fn, *args)
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(release, None))
+    return await asyncio.wrap_future(future)
+
+
+async def _ffmpeg_decode(audio_data):
+    """Pipes the upload through an ffmpeg subprocess without blocking the event loop."""
+    proc = await asyncio.create_subprocess_exec(
+        *wsgi_app.processor.ffmpeg_decode_command(),
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await proc.communicate(audio_data)
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise Exception(f"ffmpeg exited with status {proc.returncode}: {stderr.decode(errors='replace')[-200:]}")
+    y = np.frombuffer(stdout, dtype=np.float32)
+    if len(y) == 0:
+        raise ValueError("ffmpeg produced no samples")
+    return y
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def _read_body(scope, receive, limit):
+    """Reads the request body as it arrives; returns None once it exceeds limit bytes."""
+    content_length = _header(scope, b'content-length')
+    if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+        return None
+
+    buffer = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise RequestError(400, "Client disconnected")
+        buffer.extend(message.get('body', b''))
+        if len(buffer) > limit:
+            return None
+        if not message.get('more_body', False):
+            return bytes(buffer)
+
+
+def _multipart_audio(body, content_type):
+    """Contents of the 'audio' file field of a multipart/form-data body, or None."""
+    _, options = parse_options_header(content_type)
+    if not options.get('boundary'):
+        return None
+    decoder = MultipartDecoder(options['boundary'].encode('latin-1'))
+    decoder.receive_data(body)
+    decoder.receive_data(None)
+
+    chunks = []
+    in_audio = False
+    while True:
+        event = decoder.next_event()
+        if isinstance(event, (Epilogue, NeedData)):
+            break
+        if isinstance(event, (Field, File)):
+            in_audio = isinstance(event, File) and event.name == 'audio'
+        elif isinstance(event, Data) and in_audio:
+            chunks.append(event.data)
+            if not event.more_data:
+                return b''.join(chunks)
+    return None
+
+
+def _decode_json_audio(body):
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or 'audio' not in data:
+        raise RequestError(400, "Missing audio data in base64 format")
+    return wsgi_app.processor.decode_base64(data['audio'])
+
+
+async def _read_audio_upload(scope, receive):
+    """Same accepted encodings as app.py: JSON base64, raw application/octet-stream or audio/*, multipart."""
+    content_type = _header(scope, b'content-type') or ''
+    mimetype = content_type.split(';')[0].strip().lower()
+    is_raw = mimetype == 'application/octet-stream' or mimetype.startswith('audio/')
+    too_large = RequestError(413, f"Upload exceeds {wsgi_app.MAX_UPLOAD_BYTES} bytes")
+
+    if is_raw or mimetype == 'multipart/form-data':
+        with metrics.track_stage('upload'):
+            body = await _read_body(scope, receive, wsgi_app.MAX_UPLOAD_BYTES + 64 * 1024)
+        if body is None:
+            raise too_large
+        if not is_raw:
+            body = await asyncio.to_thread(_multipart_audio, body, content_type)
+            if body is None:
+                raise RequestError(400, "Missing audio file in multipart field 'audio'")
+        if len(body) > wsgi_app.MAX_UPLOAD_BYTES:
+            raise too_large
+        if not body:
+            raise RequestError(400, "Empty audio upload")
+        return body
+
+    body = await _read_body(scope, receive, MAX_JSON_BYTES)
+    if body is None:
+        raise too_large
+    with metrics.track_stage('decode'):
+        return await asyncio.to_thread(_decode_json_audio, body)
+
+
+async def _detect_voice(scope, receive):
+    """Returns (status, payload, headers) for POST /detect."""
+    # 1. Authentication
+    auth_header = _header(scope, b'x-api-key')
+    if not auth_header or auth_header != wsgi_app.API_KEY:
+        return 401, {"error": "Unauthorized"}, {}
+
+    # 2. Validation & 3. Read/decode upload, awaiting the client instead of blocking on it
+    audio_data = await _read_audio_upload(scope, receive)
+
+    result_cache = wsgi_app.result_cache
+    model_fingerprint = wsgi_app.model_manager.active.fingerprint
+    audio_key = result_cache.audio_key(audio_data) if result_cache.enabled else None
+    if audio_key:
+        cached = result_cache.get(audio_key, model_fingerprint)
+        metrics.CACHE_LOOKUPS.labels(result="miss" if cached is None else "hit").inc()
+        if cached is not None:
+            cached["cache"] = "hit"
+            cached["near_duplicate"] = False
+            return 200, cached, {}
+
+    # 4. Audio Processing (Convert): formats libsndfile can't read are decoded by an awaited ffmpeg
+    y = None
+    if wsgi_app.DECODE_MODE == 'memory' and sniff_format(audio_data) not in SNDFILE_FORMATS:
+        try:
+            with metrics.track_stage('conversion'):
+                y = await _ffmpeg_decode(audio_data)
+        except Exception as e:
+            print(f"Async ffmpeg decode failed, falling back to the in-process chain: {e}")
+
+    # 5. Feature Extraction & Inference on the bounded executor
+    result, error = await _run_cpu(_detect, None if y is not None else audio_data, y)
+    if error:
+        return 500, {"error": error}, {}
+
+    if result.get("near_duplicate"):
+        result["cache"] = "near_duplicate"
+        return 200, result, {}
+    if audio_key and result.get("stage") != "stub":
+        result_cache.put(audio_key, model_fingerprint, result)
+    result["cache"] = "miss"
+    result["near_duplicate"] = False
+    return 200, result, {}
+
+
+async def _send_json(send, status, payload, headers=None):
+    body = json.dumps(payload).encode('utf-8')
+    raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    raw_headers += [(key.lower().encode(), str(value).encode()) for key, value in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Probes the ffmpeg build (a blocking subprocess call) before the first request needs it
+            await asyncio.to_thread(wsgi_app.processor.ffmpeg_decode_command)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            cpu_executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    path, method = scope['path'], scope['method']
+    if path == '/' and method == 'GET':
+        await _send_json(send, 200, wsgi_app.api_info())
+    elif path == '/health' and method == 'GET':
+        await _send_json(send, 200, wsgi_app.health_status())
+    elif path == '/metrics' and method == 'GET':
+        payload, content_type = metrics.render()
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', content_type.encode())]})
+        await send({'type': 'http.response.body', 'body': payload})
+    elif path == '/detect' and method == 'POST':
+        with metrics.track_request('detect'):
+            try:
+                status, payload, headers = await asyncio.wait_for(_detect_voice(scope, receive), REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                metrics.record_error('request', 'DeadlineExceeded')
+                status, payload, headers = 504, {"error": f"Request exceeded its {REQUEST_TIMEOUT:g}s deadline"}, {}
+            except RequestError as e:
+                status, payload, headers = e.status, {"error": str(e)}, e.headers
+            except Exception as e:
+                status, payload, headers = 500, {"error": f"Internal process error: {str(e)}"}, {}
+        await _send_json(send, status, payload, headers)
+    elif path in ('/', '/health', '/metrics', '/detect'):
+        await _send_json(send, 405, {"error": "Method not allowed"})
+    else:
+        await _send_json(send, 404, {"error": "Not found"})
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run('asgi_app:app', host='0.0.0.0', port=int(os.getenv('PORT', 5000)),
+                workers=int(os.getenv('WEB_CONCURRENCY', 1)))
@@ -0,0 +1,258 @@
+import argparse
+import base64
+import glob
+import io
+import json
+import os
+import sys
+import time
+import librosa
+import numpy as np
+import soundfile as sf
+from utils.audio_processor import AudioProcessor, RESAMPLE_QUALITIES, SNDFILE_FORMATS, sniff_format
+from utils.feature_engine import FEATURE_FAMILIES, CASCADE_FAMILIES
+from utils.model_handler import ModelHandler
+
+DEFAULT_FILES = ['sample.wav', 'test2.wav', 'test4.wav', 't.wav', 't_ai.wav', 't_hu.wav',
+                 'sample.mp3', 'test2.mp3', 'test4.mp3', 'test5.mp3']
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+
+
+def build_clips(paths, lengths):
+    """Returns (name, bytes) per clip. WAV sources are cut to each requested length
+    at their native rate; compressed sources can only be measured whole.
+    """
+    clips = []
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"Skipping {path}: not found")
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        if not path.endswith('.wav'):
+            clips.append((f"{path}@full", data))
+            continue
+
+        y, sr = sf.read(path, dtype='float32')
+        for length in lengths:
+            if length == 'full':
+                clips.append((f"{path}@full", data))
+            elif len(y) >= float(length) * sr:
+                buffer = io.BytesIO()
+                sf.write(buffer, y[:int(float(length) * sr)], sr, format='WAV', subtype='PCM_16')
+                clips.append((f"{path}@{length}s", buffer.getvalue()))
+    return clips
+
+
+def time_stage(timings, stage, fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings.setdefault(stage, []).append(time.perf_counter() - started)
+    return result
+
+
+def run_clip(processor, model_handler, data, timings):
+    """Runs the /detect pipeline once, timing every stage separately.
+    'total' covers only what the server runs; the legacy librosa load of WAV clips is timed after it.
+    """
+    total_started = time.perf_counter()
+    encoded = base64.b64encode(data).decode('utf-8')
+
+    audio_data = time_stage(timings, 'base64_decode', processor.decode_base64, encoded)
+    # Named after the decoder bytes_to_array picks: libsndfile in-process, or an ffmpeg pipe
+    decoder = 'sndfile_decode' if sniff_format(audio_data) in SNDFILE_FORMATS else 'ffmpeg_decode'
+    y = time_stage(timings, decoder, processor.bytes_to_array, audio_data)
+
+    analysis = processor.analyze(y, processor.sample_rate)
+    time_stage(timings, 'feature:stft', lambda: analysis.power)
+    # Serving only computes the families listed in the model's feature manifest
+    for family in model_handler.feature_families or FEATURE_FAMILIES:
+        time_stage(timings, f"feature:{family}", analysis.family, family)
+    features = analysis.vector(model_handler.feature_families)
+
+    if model_handler.has_cascade:
+        time_stage(timings, 'cascade_first_stage', model_handler.predict_first_stage,
+                   analysis.subset(CASCADE_FAMILIES), 0.9)
+    if model_handler.is_loaded:
+        scaled = time_stage(timings, 'scaling', model_handler.transform, features)
+        time_stage(timings, 'inference', model_handler.predict_proba_scaled, scaled)
+
+    timings.setdefault('total', []).append(time.perf_counter() - total_started)
+
+    if data[:4] == b'RIFF':
+        # Legacy path, for comparison only: librosa decoding the WAV and resampling it to 22050 Hz
+        time_stage(timings, 'legacy_resample_load', librosa.load, io.BytesIO(audio_data), sr=processor.sample_rate)
+    return len(y) / processor.sample_rate
+
+
+def summarize(samples):
+    samples_ms = np.array(samples) * 1000
+    return {
+        "count": len(samples_ms),
+        "mean_ms": round(float(np.mean(samples_ms)), 3),
+        "p50_ms": round(float(np.percentile(samples_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples_ms, 99)), 3)
+    }
+
+
+def run_benchmark(paths, lengths, repeats, warmup=1):
+    processor = AudioProcessor()
+    model_handler = ModelHandler()
+    if not model_handler.is_loaded:
+        print("Model not loaded: scaling and inference stages are skipped")
+
+    clips = build_clips(paths, lengths)
+    if not clips:
+        raise Exception("No benchmark clips available")
+
+    results = {}
+    for name, data in clips:
+        for _ in range(warmup):
+            run_clip(processor, model_handler, data, {})
+
+        timings = {}
+        for _ in range(repeats):
+            duration = run_clip(processor, model_handler, data, timings)
+
+        total = np.sum(timings['total'])
+        results[name] = {
+            "audio_seconds": round(duration, 3),
+            "throughput_clips_per_s": round(repeats / total, 3),
+            "realtime_factor": round(duration * repeats / total, 2),
+            "stages": {stage: summarize(samples) for stage, samples in timings.items()}
+        }
+        print(f"{name:<24} total p50 {results[name]['stages']['total']['p50_ms']:>9.1f} ms  "
+              f"({results[name]['realtime_factor']}x realtime)")
+
+    return {
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "repeats": repeats,
+        "model": {"compiled": model_handler.compiled is not None, "fingerprint": model_handler.fingerprint,
+                  "feature_families": model_handler.feature_families or FEATURE_FAMILIES},
+        "clips": results
+    }
+
+
+def compare_resample_tiers(paths, reference='soxr_hq', repeats=3):
+    """Decodes every clip with each resampling tier and reports decode time, how far the
+    features move from the reference tier, and whether the classification changes.
+    """
+    model_handler = ModelHandler()
+    processors = {tier: AudioProcessor(resample_quality=tier) for tier in RESAMPLE_QUALITIES}
+    results = {}
+
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        outputs = {}
+        for tier, processor in processors.items():
+            timings = {}
+            for _ in range(repeats):
+                y = time_stage(timings, 'decode', processor.bytes_to_array, data)
+            features = processor.extract_features_from_array(y, processor.sample_rate)
+            prediction = model_handler.predict_batch(features)[0][0] if model_handler.is_loaded else None
+            outputs[tier] = (features[0], summarize(timings['decode']), prediction)
+
+        ref_features = outputs[reference][0]
+        ref_scaled = model_handler.transform(ref_features[None, :])[0] if model_handler.is_loaded else None
+        results[path] = {}
+        for tier, (features, decode_stats, prediction) in outputs.items():
+            diff = np.abs(features - ref_features)
+            entry = {
+                "decode_p50_ms": decode_stats['p50_ms'],
+                "feature_max_abs_diff": round(float(np.max(diff)), 6),
+                "feature_mean_rel_diff": round(float(np.mean(diff / (np.abs(ref_features) + 1e-8))), 6),
+            }
+            if prediction is not None:
+                scaled = model_handler.transform(features[None, :])[0]
+                entry["scaled_max_abs_diff"] = round(float(np.max(np.abs(scaled - ref_scaled))), 6)
+                entry["classification"] = prediction["classification"]
+                entry["confidence"] = prediction["confidence"]
+                entry["same_as_reference"] = prediction["classification"] == outputs[reference][2]["classification"]
+            results[path][tier] = entry
+            print(f"{path:<12} {tier:<10} decode p50 {entry['decode_p50_ms']:>8.1f} ms  "
+                  f"max feature diff {entry['feature_max_abs_diff']:.4g}  "
+                  f"{entry.get('classification', '-')} {entry.get('confidence', '')}")
+
+    return {"reference": reference, "clips": results}
+
+
+def find_regressions(current, baseline, tolerance, min_delta_ms=1.0):
+    """Flags stages whose p50 grew by more than tolerance (and by at least min_delta_ms)."""
+    regressions = []
+    for clip, clip_result in current['clips'].items():
+        base_clip = baseline.get('clips', {}).get(clip)
+        if not base_clip:
+            continue
+        for stage, stats in clip_result['stages'].items():
+            base_stats = base_clip['stages'].get(stage)
+            if not base_stats:
+                continue
+            before, after = base_stats['p50_ms'], stats['p50_ms']
+            if after > before * (1 + tolerance) and after - before >= min_delta_ms:
+                regressions.append((clip, stage, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark of the detection pipeline")
+    parser.add_argument('files', nargs='*', help="Audio files (default: bundled samples)")
+    parser.add_argument('--lengths', default='1,5,15,full', help="Clip lengths in seconds for WAV sources")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'latest.json'))
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed p50 slowdown before flagging")
+    parser.add_argument('--resample-tiers', action='store_true',
+                        help="Compare resampling quality tiers (speed, feature drift, classification)")
+    args = parser.parse_args()
+
+    paths = args.files or DEFAULT_FILES
+    if not args.files:
+        paths = sorted(set(paths) | set(glob.glob('t*.wav')))
+    lengths = [length.strip() for length in args.lengths.split(',') if length.strip()]
+
+    if args.resample_tiers:
+        report = compare_resample_tiers(paths, repeats=args.repeats)
+        output = os.path.join(os.path.dirname(args.output) or '.', 'resample_tiers.json')
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+        return 0
+
+    report = run_benchmark(paths, lengths, args.repeats)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = find_regressions(report, baseline, args.tolerance)
+    for clip, stage, before, after in regressions:
+        print(f"REGRESSION {clip} {stage}: p50 {before:.1f} ms -> {after:.1f} ms")
+    if not regressions:
+        print("No regressions against baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.aac', '.aiff', '.aif', '.opus', '.webm')
+CSV_FIELDS = ['path', 'status', 'classification', 'confidence', 'ai_probability', 'stage', 'duration',
+              'model_version', 'elapsed_ms', 'error', 'segments']
+
+# Per-process state, created once by _init_worker in every pool process
+_processor = None
+_model = None
+_options = None
+
+
+def iter_inputs(source, extensions=AUDIO_EXTENSIONS):
+    """Yields audio paths from a directory tree, or from a manifest:
+    .csv with a 'path' column, .jsonl with a "path" field, anything else one path per line.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(extensions):
+                    yield os.path.join(root, name)
+        return
+
+    with open(source, 'r', newline='') as f:
+        if source.endswith('.csv'):
+            for row in csv.DictReader(f):
+                if row.get('path'):
+                    yield row['path']
+        elif source.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)['path']
+        else:
+            for line in f:
+                if line.strip() and not line.startswith('#'):
+                    yield line.strip()
+
+
+def load_done(output, output_format, retry_errors=False):
+    """Paths already in the output file. A line cut off by an interruption is truncated away first.
+    A path scored more than once (--retry-errors appends a new row) counts with its last row.
+    """
+    if not os.path.exists(output):
+        return set()
+
+    with open(output, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+
+    latest = {}
+    with open(output, 'r', newline='') as f:
+        if output_format == 'csv':
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            latest[row['path']] = row.get('status')
+    return {path for path, status in latest.items()
+            if status == 'ok' or (status == 'error' and not retry_errors)}
+
+
+def load_model(options):
+    """The model a run scores with: options['model_version'] or the served registry version."""
+    from utils.model_registry import ModelRegistry, ModelManager
+
+    registry = ModelRegistry(options['registry'])
+    if options['model_version']:
+        if not registry.exists(options['model_version']):
+            raise Exception(f"Unknown model version: {options['model_version']}")
+        return registry.load(options['model_version'])
+    # Never poll: one run is scored by one model version
+    return ModelManager(registry, poll_interval=float('inf')).active
+
+
+def _init_worker(options):
+    # Never raises: a Pool respawns workers whose initializer fails, forever. main() has checked
+    # the model already; a failure here turns into per-file error records instead
+    global _processor, _model, _options
+    from utils.audio_processor import AudioProcessor
+
+    _options = options
+    _processor = AudioProcessor(resample_quality=options['resample_quality'], vad=options['vad'])
+    try:
+        _model = load_model(options)
+    except Exception as e:
+        print(f"Worker {os.getpid()} could not load the model: {str(e)}")
+        _model = None
+
+
+def _score_file(path):
+    from utils.cascade import classify_analyses
+    from utils.segment_scorer import SegmentScorer
+
+    started = time.perf_counter()
+    try:
+        if _model is None or not _model.is_loaded:
+            raise Exception("Model or Scaler not loaded in this worker")
+        if _options['segments']:
+            # Streams the file block by block, so long recordings keep memory flat
+            scorer = SegmentScorer(_processor, _model, window=_options['window'], overlap=_options['overlap'])
+            result = scorer.score(path)
+            result["duration"] = result.pop("analyzed_duration")
+        else:
+            with open(path, 'rb') as f:
+                y = _processor.bytes_to_array(f.read())
+            analysis = _processor.analyze(y, _processor.sample_rate)
+            results, error = classify_analyses(_model, [analysis], _options['cascade_threshold'])
+            if error:
+                raise Exception(error)
+            result = results[0]
+            result["duration"] = round(len(y) / _processor.sample_rate, 3)
+        status, error = "ok", None
+    except Exception as e:
+        result, status, error = {}, "error", str(e)
+
+    record = {"path": path, "status": status, **result, "model_version": _model.version if _model else None,
+              "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+    if error:
+        record["error"] = error
+    return record
+
+
+class ResultWriter:
+    """Appends one line per scored file and flushes, so an interrupted run loses nothing."""
+
+    def __init__(self, output, output_format):
+        self.output_format = output_format
+        exists = os.path.exists(output) and os.path.getsize(output) > 0
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        self.file = open(output, 'a', newline='')
+        self.writer = None
+        if output_format == 'csv':
+            self.writer = csv.DictWriter(self.file, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            if not exists:
+                self.writer.writeheader()
+
+    def write(self, record):
+        if self.writer is not None:
+            row = dict(record)
+            if 'segments' in row:
+                row['segments'] = json.dumps(row['segments'])
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a directory or manifest of audio files offline")
+    parser.add_argument('input', help="Directory of audio files, or a manifest (.txt, .csv, .jsonl)")
+    parser.add_argument('--output', default='bulk_results.jsonl', help="Results file (.jsonl or .csv)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Default: from the output extension")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunksize', type=int, default=8, help="Files handed to a worker at a time")
+    parser.add_argument('--max-tasks-per-child', type=int, default=2000,
+                        help="Recycle worker processes after this many files")
+    parser.add_argument('--segments', action='store_true', help="Include per-window scores")
+    parser.add_argument('--window', type=float, default=1.0)
+    parser.add_argument('--overlap', type=float, default=0.5)
+    parser.add_argument('--retry-errors', action='store_true',
+                        help="Rescore files that failed in a previous run (appends a new row; the last row per path wins)")
+    parser.add_argument('--model-version', help="Registry version to score with (default: the served one)")
+    args = parser.parse_args()
+
+    output_format = args.format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+    done = load_done(args.output, output_format, args.retry_errors)
+    if done:
+        print(f"Resuming: {len(done)} files already scored in {args.output}")
+    paths = (path for path in iter_inputs(args.input) if path not in done)
+
+    options = {
+        "segments": args.segments,
+        "window": args.window,
+        "overlap": args.overlap,
+        "model_version": args.model_version,
+        "registry": os.getenv('MODEL_REGISTRY_DIR', 'models/registry'),
+        "resample_quality": os.getenv('RESAMPLE_QUALITY', 'soxr_hq'),
+        "vad": os.getenv('VAD_ENABLED', '0') == '1',
+        "cascade_threshold": float(os.getenv('CASCADE_THRESHOLD', 0.9)) if os.getenv('CASCADE_ENABLED', '1') == '1' else None
+    }
+    # Fail fast here: a Pool initializer that raises would respawn workers endlessly
+    try:
+        model = load_model(options)
+        if not model.is_loaded:
+            raise Exception("Model or Scaler not loaded. Please ensure .pkl files are in models/ directory.")
+    except Exception as e:
+        print(f"Cannot score: {str(e)}")
+        return 1
+    print(f"Scoring with model version {model.version}")
+    if not options["model_version"]:
+        # Workers score with the same version even if CURRENT moves during the run
+        options["model_version"] = model.version if model.version != 'legacy' else None
+    del model
+
+    # One process per core: keep numpy/BLAS from starting a thread pool in each of them
+    for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMBA_NUM_THREADS'):
+        os.environ.setdefault(name, '1')
+
+    writer = ResultWriter(args.output, output_format)
+    scored = failed = 0
+    started = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    try:
+        with context.Pool(args.workers, initializer=_init_worker, initargs=(options,),
+                          maxtasksperchild=args.max_tasks_per_child) as pool:
+            for record in pool.imap_unordered(_score_file, paths, chunksize=args.chunksize):
+                writer.write(record)
+                scored += 1
+                failed += record["status"] != "ok"
+                if scored % 100 == 0:
+                    rate = scored / (time.perf_counter() - started)
+                    print(f"{scored} files scored ({failed} failed), {rate:.1f} files/s")
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume")
+        return 130
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Done: {scored} files in {elapsed:.1f}s ({failed} failed), results in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import os
+import subprocess
+import sys
+import librosa
+import numpy as np
+from utils.audio_processor import AudioProcessor
+from utils.feature_engine import FEATURE_SIZE
+from utils.model_handler import ModelHandler
+
+DEFAULT_FILES = ['sample.wav', 'test2.wav', 'test4.wav', 't.wav', 't_ai.wav', 't_hu.wav']
+COMPRESSED_FILES = ['sample.mp3', 'test2.mp3', 'test4.mp3', 'test5.mp3']
+# Shared-STFT features vs the per-feature librosa calls: same maths, different summation order
+FEATURE_RTOL = 1e-4
+FEATURE_ATOL = 1e-6
+# A flipped split near a threshold moves one tree's vote; anything beyond that is a real change
+PROBABILITY_TOL = 0.01
+# Compressed decoders differ in priming and padding, so the served ffmpeg decode is compared with
+# librosa.load by level and length rather than sample by sample; a downmix gain error shows as ~3 dB
+LEVEL_TOL_DB = 0.5
+LENGTH_TOL_SECONDS = 0.1
+
+
+def baseline_features(y, sr):
+    """The original extract_features: every family from its own librosa.feature call, in float64."""
+    features = []
+
+    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=40)
+    features.extend(np.mean(mfccs, axis=1))
+    features.extend(np.std(mfccs, axis=1))
+    features.extend(np.mean(librosa.feature.delta(mfccs), axis=1))
+    features.extend(np.mean(librosa.feature.delta(mfccs, order=2), axis=1))
+
+    for values in (librosa.feature.spectral_flatness(y=y),
+                   librosa.feature.spectral_centroid(y=y, sr=sr),
+                   librosa.feature.spectral_rolloff(y=y, sr=sr),
+                   librosa.feature.spectral_bandwidth(y=y, sr=sr)):
+        features.append(np.mean(values))
+        features.append(np.std(values))
+
+    features.extend(np.mean(librosa.feature.spectral_contrast(y=y, sr=sr), axis=1))
+
+    zcr = librosa.feature.zero_crossing_rate(y)
+    features.append(np.mean(zcr))
+    features.append(np.std(zcr))
+
+    features.extend(np.mean(librosa.feature.chroma_stft(y=y, sr=sr), axis=1))
+    features.extend(np.mean(librosa.feature.tonnetz(y=librosa.effects.harmonic(y), sr=sr), axis=1))
+
+    rms = librosa.feature.rms(y=y)
+    features.append(np.mean(rms))
+    features.append(np.std(rms))
+
+    features.extend(np.mean(librosa.feature.melspectrogram(y=y, sr=sr, n_mels=40), axis=1))
+
+    feat_arr = np.array(features)
+    feat_arr = np.pad(feat_arr, (0, FEATURE_SIZE - len(feat_arr)), mode='constant')
+    return feat_arr.reshape(1, -1)
+
+
+def check_feature_parity(paths=DEFAULT_FILES, model_path='models/model.pkl', scaler_path='models/scaler.pkl'):
+    """Compares the served feature vector and the model's probabilities with the baseline path on WAVs."""
+    processor = AudioProcessor()
+    model_handler = ModelHandler(model_path, scaler_path, use_compiled=False)
+    if not model_handler.is_loaded:
+        raise Exception(f"Could not load {model_path} / {scaler_path}")
+
+    failures = []
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"Skipping {path}: not found")
+            continue
+        y, sr = processor.load_file(path)
+        # Both paths see the same padded signal, so only feature extraction is compared
+        y = processor.analyze(y, sr, vad=False).y
+
+        expected = baseline_features(y, sr)
+        actual = processor.extract_features_from_array(y, sr)
+        feature_diff = np.abs(actual - expected) / (FEATURE_ATOL + FEATURE_RTOL * np.abs(expected))
+        worst = int(np.argmax(feature_diff))
+
+        expected_probs = model_handler.predict_proba_scaled(model_handler.transform(expected))
+        actual_probs = model_handler.predict_proba_scaled(model_handler.transform(actual))
+        prob_diff = float(np.max(np.abs(expected_probs - actual_probs)))
+
+        print(f"{path}: dtype {actual.dtype}, worst feature {worst} off by "
+              f"{float(np.abs(actual - expected)[0, worst]):.2e} ({float(feature_diff[0, worst]):.2f}x tolerance), "
+              f"max probability difference {prob_diff:.2e}")
+        if actual.dtype != expected.dtype or feature_diff.max() > 1 or prob_diff > PROBABILITY_TOL:
+            failures.append(path)
+
+    if failures:
+        raise Exception(f"Features differ from the baseline librosa path beyond tolerance: {', '.join(failures)}")
+    print(f"All clips within rtol={FEATURE_RTOL}, atol={FEATURE_ATOL} (features) "
+          f"and {PROBABILITY_TOL} (probabilities)")
+
+
+def check_decode_parity(paths=COMPRESSED_FILES):
+    """Compares the ffmpeg decode the server runs on compressed uploads with librosa.load."""
+    processor = AudioProcessor()
+    model_handler = ModelHandler(use_compiled=False)
+
+    failures = []
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"Skipping {path}: not found")
+            continue
+        expected, sr = librosa.load(path, sr=processor.sample_rate)
+        with open(path, 'rb') as f:
+            result = subprocess.run(processor.ffmpeg_decode_command(), input=f.read(),
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        actual = np.frombuffer(result.stdout, dtype=np.float32)
+
+        level_diff = 20 * np.log10((np.sqrt(np.mean(actual.astype(np.float64) ** 2)) + 1e-12) /
+                                   (np.sqrt(np.mean(expected.astype(np.float64) ** 2)) + 1e-12))
+        length_diff = abs(len(actual) - len(expected)) / sr
+        message = f"{path}: level {level_diff:+.2f} dB, length off by {length_diff:.3f}s"
+        if model_handler.is_loaded:
+            expected_probs = model_handler.predict_proba_scaled(model_handler.transform(
+                processor.extract_features_from_array(expected, sr)))
+            actual_probs = model_handler.predict_proba_scaled(model_handler.transform(
+                processor.extract_features_from_array(actual, sr)))
+            message += f", max probability difference {float(np.max(np.abs(expected_probs - actual_probs))):.2e}"
+        print(message)
+        if abs(level_diff) > LEVEL_TOL_DB or length_diff > LENGTH_TOL_SECONDS:
+            failures.append(path)
+
+    if failures:
+        raise Exception(f"ffmpeg decode differs from librosa.load beyond tolerance: {', '.join(failures)}")
+    print(f"All compressed clips within {LEVEL_TOL_DB} dB and {LENGTH_TOL_SECONDS}s of librosa.load")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        check_feature_parity([path for path in sys.argv[1:] if path.endswith('.wav')])
+        check_decode_parity([path for path in sys.argv[1:] if not path.endswith('.wav')])
+    else:
+        check_feature_parity()
+        check_decode_parity()
@@ -0,0 +1,36 @@
+import os
+import sys
+import joblib
+import numpy as np
+from utils.compiled_forest import CompiledForest
+from utils.model_handler import file_fingerprint
+
+def export_compiled_model(model_path='models/model.pkl', scaler_path='models/scaler.pkl'):
+    """Compiles the fitted scaler + forest into flat NumPy arrays next to the .pkl files."""
+    model = joblib.load(model_path)
+    scaler = joblib.load(scaler_path)
+    compiled_dir = os.path.join(os.path.dirname(model_path), 'compiled')
+
+    compiled = CompiledForest.from_sklearn(model, scaler)
+    # Same key ModelHandler computes, without unpickling the forest a second time
+    fingerprint = file_fingerprint([model_path, scaler_path])
+    compiled.save(compiled_dir, source_fingerprint=fingerprint)
+
+    # Verify against sklearn on random inputs around the training distribution
+    X = np.random.normal(scaler.mean_, scaler.scale_, size=(64, compiled.meta['n_features'])).astype(np.float32)
+    expected = model.predict_proba(scaler.transform(X))
+    actual = compiled.predict_proba(compiled.transform(X))
+    max_diff = float(np.max(np.abs(expected - actual)))
+
+    print(f"Compiled {compiled.meta['n_estimators']} trees (max depth {compiled.max_depth}) into {compiled_dir}")
+    print(f"Compiled size: {compiled.nbytes / 1e6:.1f} MB, pickle size: {os.path.getsize(model_path) / 1e6:.1f} MB")
+    print(f"Max probability difference vs sklearn: {max_diff:.2e}")
+    if max_diff > 1e-9:
+        raise Exception("Compiled model does not reproduce sklearn probabilities")
+    return compiled
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        export_compiled_model(sys.argv[1], sys.argv[2])
+    else:
+        export_compiled_model()
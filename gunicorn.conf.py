@@ -0,0 +1,44 @@
+import gc
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+# More than one thread switches the sync worker to gthread
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = 120
+
+# Every worker writes its metric samples here; /metrics aggregates them.
+# Must be set before app.py (and prometheus_client) is imported.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'voice_detect_metrics'))
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+# Import app.py (and load the model) once in the master; forked workers share the pages copy-on-write
+preload_app = True
+
+def when_ready(server):
+    # Move the preloaded objects out of the GC's reach so collections in the workers
+    # don't write to (and thereby copy) the shared pages
+    gc.freeze()
+    # Admission's queue-wait estimate counts requests beyond workers x threads as waiting; read the
+    # effective settings here so --threads / --workers on the command line are honoured too.
+    # Still before the fork, so every worker inherits it
+    if not os.getenv('ADMISSION_CAPACITY'):
+        from app import admission
+        admission.capacity = max(1, server.cfg.workers * server.cfg.threads)
+
+def worker_abort(worker):
+    # Runs in a worker killed for exceeding the timeout: give back its admission slots
+    from app import admission
+    admission.release_all()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+    # Jobs owned by a dead worker died with its pool; free their queue slots
+    from app import admission, job_manager
+    job_manager.release_worker(worker.pid)
+    # Also covers workers killed by the OOM killer or SIGKILL, where worker_abort never runs
+    admission.release_worker(worker.pid)
@@ -0,0 +1,273 @@
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+DEFAULT_FILES = ['sample.wav', 'test2.wav', 'test4.wav', 't.wav', 't_ai.wav', 't_hu.wav',
+                 'sample.mp3', 'test2.mp3', 'test4.mp3', 'test5.mp3']
+
+_local = threading.local()
+
+
+def cut_wav(path, seconds):
+    """First `seconds` of a WAV file as WAV bytes, or None if the file is shorter."""
+    with wave.open(path, 'rb') as source:
+        frames = int(seconds * source.getframerate())
+        if source.getnframes() < frames:
+            return None
+        params = source.getparams()
+        data = source.readframes(frames)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as target:
+        target.setparams(params)
+        target.writeframes(data)
+    return buffer.getvalue()
+
+
+def build_clips(paths, lengths):
+    """Returns {length: [(name, bytes), ...]}. WAVs are cut to each length; other formats only count as 'full'."""
+    clips = {length: [] for length in lengths}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        for length in lengths:
+            if length == 'full':
+                with open(path, 'rb') as f:
+                    clips[length].append((path, f.read()))
+            elif path.endswith('.wav'):
+                try:
+                    data = cut_wav(path, float(length))
+                except wave.Error:
+                    data = None
+                if data:
+                    clips[length].append((f"{path}@{length}s", data))
+    return {length: items for length, items in clips.items() if items}
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 1)
+    }
+
+
+def send(url, api_key, data, encoding, timeout):
+    """Posts one clip; returns (outcome, status_code). Each thread keeps its own keep-alive session."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+
+    headers = {"X-API-KEY": api_key}
+    try:
+        if encoding == 'raw':
+            headers["Content-Type"] = "application/octet-stream"
+            response = session.post(url, headers=headers, data=data, timeout=timeout)
+        else:
+            payload = {"audio": base64.b64encode(data).decode('utf-8')}
+            response = session.post(url, headers=headers, json=payload, timeout=timeout)
+    except requests.Timeout:
+        return "timeout", None
+    except requests.RequestException:
+        return "connection_error", None
+    return ("ok" if response.status_code == 200 else "http_error"), response.status_code
+
+
+def run_load(url, api_key, clips, weights, concurrency, rate, duration, total, encoding, timeout):
+    """Drives the API and collects per-request outcomes.
+    With a rate, requests are scheduled open-loop at fixed intervals and latency is measured from the
+    scheduled start, so a saturated server's queueing shows up instead of being hidden.
+    """
+    lengths = list(clips)
+    records = []
+    lock = threading.Lock()
+    in_flight = threading.Semaphore(concurrency)
+
+    def task(scheduled, length):
+        try:
+            name, data = random.choice(clips[length])
+            started = time.perf_counter()
+            outcome, status = send(url, api_key, data, encoding, timeout)
+            finished = time.perf_counter()
+            with lock:
+                records.append({"length": length, "clip": name, "outcome": outcome, "status": status,
+                                "latency": finished - scheduled, "service_time": finished - started})
+        finally:
+            if not rate:
+                in_flight.release()
+
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        sent = 0
+        while (total is None or sent < total) and (deadline is None or time.perf_counter() < deadline):
+            length = random.choices(lengths, weights=weights)[0]
+            if rate:
+                scheduled = started + sent / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(task, scheduled, length)
+            else:
+                # Closed loop: a new request starts as soon as one of `concurrency` finishes
+                in_flight.acquire()
+                executor.submit(task, time.perf_counter(), length)
+            sent += 1
+    elapsed = time.perf_counter() - started
+    return records, elapsed
+
+
+def summarize(records, elapsed):
+    ok = [record for record in records if record["outcome"] == "ok"]
+    outcomes = {}
+    statuses = {}
+    for record in records:
+        outcomes[record["outcome"]] = outcomes.get(record["outcome"], 0) + 1
+        if record["status"] is not None:
+            statuses[str(record["status"])] = statuses.get(str(record["status"]), 0) + 1
+
+    by_length = {}
+    for length in sorted({record["length"] for record in records}, key=str):
+        subset = [record for record in records if record["length"] == length]
+        by_length[length] = {
+            "requests": len(subset),
+            "error_rate": round(1 - sum(r["outcome"] == "ok" for r in subset) / len(subset), 4),
+            "latency": percentiles([r["latency"] for r in subset if r["outcome"] == "ok"])
+        }
+
+    return {
+        "requests": len(records),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0,
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else 0,
+        "timeouts": outcomes.get("timeout", 0),
+        "outcomes": outcomes,
+        "status_codes": statuses,
+        "latency": percentiles([record["latency"] for record in ok]),
+        "service_time": percentiles([record["service_time"] for record in ok]),
+        "by_length": by_length
+    }
+
+
+def start_server(port, workers, worker_class, threads, stub, app='app:app'):
+    """Starts gunicorn with the repo's config so runs can be compared across worker counts and classes."""
+    # Repeated sample clips would otherwise be answered from the result cache
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), RESULT_CACHE_SIZE='0', RESULT_CACHE_DIR='')
+    if stub:
+        env["STUB_MODEL"] = stub
+    cmd = ['gunicorn', '--config', 'gunicorn.conf.py', '--worker-class', worker_class, '--threads', str(threads), app]
+    server = subprocess.Popen(cmd, env=env)
+
+    health_url = f"http://127.0.0.1:{port}/health"
+    for _ in range(600):
+        if server.poll() is not None:
+            raise Exception(f"gunicorn exited with status {server.returncode}")
+        try:
+            if requests.get(health_url, timeout=1).status_code == 200:
+                return server
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    server.terminate()
+    raise Exception("Server did not become healthy within 60s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load generator for the /detect API")
+    parser.add_argument('files', nargs='*', help="Audio files to draw clips from (default: bundled samples)")
+    parser.add_argument('--url', default='http://127.0.0.1:5000/detect')
+    parser.add_argument('--api-key', default=os.getenv('API_KEY', 'guvi_ai_voice_secret_key'))
+    parser.add_argument('--concurrency', type=int, default=8, help="Client threads / requests in flight")
+    parser.add_argument('--rate', type=float, default=0, help="Requests per second (0 = closed loop)")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run (0 = use --requests)")
+    parser.add_argument('--requests', type=int, help="Stop after this many requests")
+    parser.add_argument('--lengths', default='1,5,15,full', help="Clip lengths in seconds cut from WAV sources")
+    parser.add_argument('--weights', help="Relative frequency of each length (default: equal)")
+    parser.add_argument('--encoding', choices=['json', 'raw'], default='json')
+    parser.add_argument('--timeout', type=float, default=30, help="Client-side timeout per request")
+    parser.add_argument('--label', help="Name for this run in the report, e.g. 'sync-4w'")
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'load_test.json'))
+    parser.add_argument('--spawn-server', action='store_true', help="Start gunicorn locally for the run")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--worker-class', default='sync')
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--app', default='app:app',
+                        help="Application to serve, e.g. asgi_app:app with --worker-class uvicorn.workers.UvicornWorker")
+    parser.add_argument('--stub', choices=['decode', 'features'],
+                        help="With --spawn-server: skip inference (and with 'decode' feature extraction too)")
+    args = parser.parse_args()
+
+    lengths = [length.strip() for length in args.lengths.split(',') if length.strip()]
+    clips = build_clips(args.files or DEFAULT_FILES, lengths)
+    if not clips:
+        print("No clips available")
+        return 1
+    weights = [float(weight) for weight in args.weights.split(',')] if args.weights else [1.0] * len(lengths)
+    weights = [weight for length, weight in zip(lengths, weights) if length in clips]
+
+    server = None
+    url = args.url
+    if args.spawn_server:
+        port = 5055
+        url = f"http://127.0.0.1:{port}/detect"
+        server = start_server(port, args.workers, args.worker_class, args.threads, args.stub, args.app)
+
+    try:
+        print(f"Load testing {url}: concurrency {args.concurrency}, "
+              f"{'rate ' + str(args.rate) + '/s' if args.rate else 'closed loop'}, clips {sorted(clips)}")
+        records, elapsed = run_load(url, args.api_key, clips, weights, args.concurrency, args.rate,
+                                    args.duration or None, args.requests, args.encoding, args.timeout)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "label": args.label,
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "config": {
+            "url": url, "concurrency": args.concurrency, "rate": args.rate, "encoding": args.encoding,
+            "timeout": args.timeout, "lengths": lengths, "weights": weights,
+            "server": {"workers": args.workers, "worker_class": args.worker_class, "threads": args.threads,
+                       "stub": args.stub, "app": args.app} if args.spawn_server else None
+        },
+        **summarize(records, elapsed)
+    }
+
+    latency = report["latency"]
+    print(f"{report['requests']} requests in {report['elapsed_s']}s: {report['throughput_rps']} req/s, "
+          f"error rate {report['error_rate']*100:.2f}%, {report['timeouts']} timeouts")
+    if latency:
+        print(f"Latency p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, p99 {latency['p99_ms']} ms, "
+              f"max {latency['max_ms']} ms")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import argparse
+import json
+import os
+import sys
+from utils.model_registry import ModelRegistry
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the versioned model registry")
+    parser.add_argument('--registry', default=os.getenv('MODEL_REGISTRY_DIR', 'models/registry'))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help="List versions and the current/shadow pointers")
+    publish = commands.add_parser('publish', help="Copy models/*.pkl (+ compiled/, manifest) into a new version")
+    publish.add_argument('--source', default='models')
+    publish.add_argument('--version')
+    promote = commands.add_parser('promote', help="Serve a version; running workers swap it in on their next poll")
+    promote.add_argument('version')
+    shadow = commands.add_parser('shadow', help="Score sampled traffic on a candidate version")
+    shadow.add_argument('version', nargs='?', help="Omit to stop shadowing")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == 'list':
+        current, candidate = registry.current_version(), registry.shadow_version()
+        for version in registry.versions():
+            marker = '*' if version == current else ('s' if version == candidate else ' ')
+            print(f"{marker} {version}  {json.dumps(registry.metadata(version))}")
+    elif args.command == 'publish':
+        print(registry.publish(args.source, version=args.version))
+    elif args.command == 'promote':
+        registry.set_current(args.version)
+        print(f"CURRENT -> {args.version}")
+    elif args.command == 'shadow':
+        registry.set_shadow(args.version)
+        print(f"SHADOW -> {args.version or '(none)'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
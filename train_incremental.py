@@ -0,0 +1,251 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import joblib
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier
+from sklearn.preprocessing import StandardScaler
+from utils.feature_engine import FEATURE_SIZE
+from utils.feature_manifest import load_feature_families, mask_families
+from utils.feature_store import FeatureStore
+from utils.model_handler import file_fingerprint
+from train_smart_model import load_source_features, save_and_publish, _init_chunk_worker
+
+MODEL_PATH = os.path.join('models', 'model.pkl')
+SCALER_PATH = os.path.join('models', 'scaler.pkl')
+CASCADE_MODEL_PATH = os.path.join('models', 'cascade_model.pkl')
+CASCADE_SCALER_PATH = os.path.join('models', 'cascade_scaler.pkl')
+STATE_PATH = os.path.join('models', 'incremental_state.json')
+RESERVOIR_PATH = os.path.join('models', 'incremental_reservoir.npz')
+CHUNK_DURATION = 1.0
+OVERLAP = 0.5
+# (noisy copies per chunk, noise level range) per label, as in train_smart_model
+AUGMENTATION = {1: (5, 0.005, 0.02), 0: (7, 0.01, 0.05)}
+LABELS = {'1': 1, 'ai': 1, 'ai_generated': 1, '0': 0, 'human': 0}
+
+
+def augment(features, label, rng):
+    """The original rows plus noisy copies, each copy with its own noise level."""
+    copies, low, high = AUGMENTATION[label]
+    rows = [features]
+    for _ in range(copies):
+        levels = rng.uniform(low, high, size=(len(features), 1))
+        rows.append(features + rng.normal(0, 1, features.shape) * levels)
+    return np.vstack(rows)
+
+
+def synthetic_rows(rng, count=500):
+    """The 'robotic pattern' AI rows of train_smart_model, added once when a forest is started."""
+    rows = rng.normal(0, 1.0, size=(count, FEATURE_SIZE))
+    rows[:, 120:122] = 0.001
+    return rows
+
+
+class Reservoir:
+    """A fixed-size uniform sample (Algorithm R) of every un-augmented row seen per class.
+    It is mixed into each batch so new trees also see earlier data and both classes,
+    and serves as the bounded training sample for the cascade first stage.
+    """
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.rows = {label: np.zeros((size, FEATURE_SIZE)) for label in (0, 1)}
+        self.seen = {0: 0, 1: 0}
+
+    def add(self, features, label):
+        for row in features:
+            seen = self.seen[label]
+            slot = seen if seen < self.size else self.rng.integers(seen + 1)
+            if slot < self.size:
+                self.rows[label][slot] = row
+            self.seen[label] = seen + 1
+
+    def sample(self):
+        counts = {label: min(self.seen[label], self.size) for label in (0, 1)}
+        X = np.vstack([self.rows[label][:counts[label]] for label in (0, 1)])
+        y = np.concatenate([np.full(counts[label], label) for label in (0, 1)])
+        return X, y
+
+    def save(self, path):
+        np.savez(path, human=self.rows[0], ai=self.rows[1], seen=np.array([self.seen[0], self.seen[1]]))
+
+    @classmethod
+    def load(cls, path, size, rng):
+        reservoir = cls(size, rng)
+        try:
+            data = np.load(path)
+        except OSError:
+            return reservoir
+        for label, name in ((0, 'human'), (1, 'ai')):
+            seen = int(data['seen'][label])
+            count = min(seen, len(data[name]), size)
+            reservoir.rows[label][:count] = data[name][:count]
+            # A reservoir that is not full (or was just enlarged) restarts sampling from what it holds
+            reservoir.seen[label] = seen if count == size else count
+        return reservoir
+
+
+def read_sources(ai_paths, human_paths, manifest=None):
+    """(path, label) pairs from the command line and an optional path,label CSV manifest."""
+    sources = [(path, 1) for path in ai_paths] + [(path, 0) for path in human_paths]
+    if manifest:
+        with open(manifest, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                label = LABELS.get(str(row['label']).strip().lower())
+                if label is None:
+                    raise Exception(f"Unknown label '{row['label']}' for {row['path']}")
+                sources.append((row['path'], label))
+    return sources
+
+
+def load_state():
+    try:
+        with open(STATE_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def fit_batch(model, scaler, X_new, y_new, reservoir, trees_per_batch):
+    """Grows trees_per_batch new trees on one batch plus the reservoir; existing trees are untouched."""
+    X_old, y_old = reservoir.sample()
+    X = np.vstack([X_new, X_old])
+    y = np.concatenate([y_new, y_old])
+    if len(np.unique(y)) < 2:
+        raise Exception("Batch holds a single class and no earlier rows of the other; add sources of both labels")
+
+    grown = len(getattr(model, 'estimators_', []))
+    model.set_params(n_estimators=grown + trees_per_batch)
+    model.fit(scaler.transform(X), y)
+    print(f"  Grew trees {grown}-{grown + trees_per_batch - 1} on {len(X_new)} new + {len(X_old)} reservoir rows")
+
+
+def train_incremental(sources, trees_per_batch=50, batch_rows=4000, reservoir_size=2000, seed=None,
+                      retrain_cascade=False):
+    """Adds trees for sources not yet consumed, streaming their feature shards batch by batch.
+    Peak memory is one batch (with augmentation) plus the reservoir, whatever the corpus size.
+    The existing cascade first stage is kept: the reservoir only holds rows seen by incremental runs
+    (none of train_smart_model's corpus, augmentation or synthetic rows), and the cascade decides
+    most traffic on its own. retrain_cascade refits it on the reservoir anyway.
+    """
+    rng = np.random.default_rng(seed)
+    store = FeatureStore(os.getenv('FEATURE_STORE_DIR', 'feature_store'))
+    state = load_state()
+
+    existing = os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH)
+    if existing and state.get('model_fingerprint') != file_fingerprint([MODEL_PATH, SCALER_PATH]):
+        # models/ was replaced (e.g. by a full train_smart_model run): earlier consumption no longer applies
+        print("Model changed outside incremental training; starting a new consumption log")
+        state = {}
+    consumed = state.get('consumed', {})
+    reservoir = Reservoir.load(RESERVOIR_PATH, reservoir_size, rng) if state else Reservoir(reservoir_size, rng)
+
+    print("--- Incremental 1/3: Featurizing new sources into the feature store ---")
+    pending = []
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_chunk_worker) as pool:
+        for path, label in sources:
+            key = store.shard_key(path, CHUNK_DURATION, OVERLAP)
+            if key in consumed or (key, label) in pending:
+                continue
+            print(f"Source ({'AI' if label == 1 else 'Human'}): {path}")
+            load_source_features(path, store, pool, CHUNK_DURATION, OVERLAP)
+            pending.append((key, label))
+    if not pending:
+        print("No new sources; the model is up to date")
+        return None
+
+    # New trees see the same zeroed families as the existing ones (and as serving); a new forest keeps all
+    families = load_feature_families('models', file_fingerprint([MODEL_PATH, SCALER_PATH])) if existing else None
+
+    if existing:
+        model = joblib.load(MODEL_PATH)
+        # Frozen: the existing trees' thresholds live in this scaler's space
+        scaler = joblib.load(SCALER_PATH)
+        model.set_params(warm_start=True, n_jobs=-1)
+        synthetic = None
+    else:
+        print("--- Incremental 2/3: Fitting the scaler with partial_fit ---")
+        synthetic = synthetic_rows(rng)
+        scaler = StandardScaler()
+        for key, label in pending:
+            scaler.partial_fit(augment(mask_families(np.asarray(store.load(key)[0]), families), label, rng))
+        scaler.partial_fit(synthetic)
+        model = ExtraTreesClassifier(
+            n_estimators=trees_per_batch,
+            max_depth=None,
+            min_samples_split=2,
+            class_weight='balanced',
+            n_jobs=-1,
+            random_state=42,
+            warm_start=True
+        )
+
+    print("--- Incremental 3/3: Growing the forest batch by batch ---")
+    batch, labels, batch_sources = [], [], []
+    rows_in_batch = 0
+    if synthetic is not None:
+        batch.append(synthetic)
+        labels.append(np.ones(len(synthetic), dtype=int))
+    for index, (key, label) in enumerate(pending):
+        features = mask_families(np.asarray(store.load(key)[0]), families)
+        rows = augment(features, label, rng)
+        batch.append(rows)
+        labels.append(np.full(len(rows), label))
+        batch_sources.append((features, label))
+        rows_in_batch += len(features)
+
+        if rows_in_batch >= batch_rows or index == len(pending) - 1:
+            fit_batch(model, scaler, np.vstack(batch), np.concatenate(labels), reservoir, trees_per_batch)
+            for features, label in batch_sources:
+                reservoir.add(features, label)
+            batch, labels, batch_sources = [], [], []
+            rows_in_batch = 0
+
+    cascade = None
+    if existing and not retrain_cascade and os.path.exists(CASCADE_MODEL_PATH) and os.path.exists(CASCADE_SCALER_PATH):
+        cascade = (joblib.load(CASCADE_MODEL_PATH), joblib.load(CASCADE_SCALER_PATH))
+
+    X_sample, y_sample = reservoir.sample()
+    save_and_publish(model, scaler, X_sample, y_sample, {
+        "incremental": True,
+        "trees": len(model.estimators_),
+        "new_sources": len(pending),
+        "samples_seen": int(sum(reservoir.seen.values()))
+    }, families=families, cascade=cascade)
+
+    for key, label in pending:
+        consumed[key] = label
+    reservoir.save(RESERVOIR_PATH)
+    with open(STATE_PATH, 'w') as f:
+        json.dump({"model_fingerprint": file_fingerprint([MODEL_PATH, SCALER_PATH]), "consumed": consumed,
+                   "trees": len(model.estimators_)}, f, indent=2)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grow the forest from new labelled audio without retraining")
+    parser.add_argument('--ai', nargs='*', default=[], help="AI-generated source files")
+    parser.add_argument('--human', nargs='*', default=[], help="Human source files")
+    parser.add_argument('--manifest', help="CSV with path,label columns (label: ai/human or 1/0)")
+    parser.add_argument('--trees-per-batch', type=int, default=50)
+    parser.add_argument('--batch-rows', type=int, default=4000, help="Un-augmented rows per batch")
+    parser.add_argument('--reservoir-size', type=int, default=2000, help="Rows kept per class across runs")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--retrain-cascade', action='store_true',
+                        help="Refit the cascade first stage on the reservoir instead of keeping the current one")
+    args = parser.parse_args()
+
+    sources = read_sources(args.ai, args.human, args.manifest)
+    if not sources:
+        parser.error("no sources given")
+    train_incremental(sources, args.trees_per_batch, args.batch_rows, args.reservoir_size, args.seed,
+                      args.retrain_cascade)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,8 +3,15 @@ import joblib
 import numpy as np
 import librosa
 from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.preprocessing import StandardScaler
 from utils.audio_processor import AudioProcessor
+from utils.feature_store import FeatureStore
+from export_compiled_model import export_compiled_model
+from utils.feature_engine import FEATURE_FAMILIES, CASCADE_FAMILIES, family_indices
+from utils.feature_manifest import build_feature_manifest, save_feature_manifest, select_feature_families, \
+    mask_families
+from utils.model_registry import ModelRegistry
 
 def extract_chunks(audio_path, chunk_duration=1.0, overlap=0.5):
     """Splits audio into overlapping chunks for more training data."""
@@ -23,12 +30,40 @@ def extract_chunks(audio_path, chunk_duration=1.0, overlap=0.5):
         
     return chunks, sr
 
+_chunk_processor = None
+
+def _init_chunk_worker():
+    """Each pool process builds its own AudioProcessor (and filterbanks) once."""
+    global _chunk_processor
+    _chunk_processor = AudioProcessor()
+
+def _chunk_features(chunk, sr):
+    return _chunk_processor.extract_features_from_array(chunk, sr).flatten()
+
+def load_source_features(audio_path, store, pool, chunk_duration=1.0, overlap=0.5):
+    """Returns one feature row per chunk of audio_path, computing them only if the store misses."""
+    key = store.shard_key(audio_path, chunk_duration, overlap)
+    cached = store.load(key)
+    if cached is not None:
+        print(f"  Using cached features ({len(cached[0])} chunks)")
+        return cached[0]
+
+    chunks, sr = extract_chunks(audio_path, chunk_duration, overlap)
+    step = int(chunk_duration * sr) - int(overlap * sr)
+    # Chunks stay in memory and are featurized across the pool - no temp .wav round-trip
+    rows = list(pool.map(_chunk_features, chunks, [sr] * len(chunks), chunksize=8))
+    features = np.vstack(rows)
+    store.save(key, features, np.arange(len(chunks)) * step)
+    print(f"  Extracted features for {len(chunks)} chunks")
+    return features
+
 def train_smart_model():
     """
     Highly advanced training using 256 granular speech analysis features.
     Implements chunking and high-fidelity augmentation to detect single-word AI speech.
     """
-    processor = AudioProcessor()
+    store = FeatureStore(os.getenv('FEATURE_STORE_DIR', 'feature_store'))
+    pool = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_chunk_worker)
     X = []
     y = []
 
@@ -44,18 +79,8 @@ def train_smart_model():
     for s in ai_refs:
         if os.path.exists(s):
             print(f"Processing AI Source (Chunking): {s}")
-            chunks, sr = extract_chunks(s, chunk_length, overlap)
-            
-            for chunk in chunks:
-                # Save chunk to temp file for processor
-                temp_chunk_path = "temp_training_chunk.wav"
-                librosa.output.write_wav(temp_chunk_path, chunk, sr) if hasattr(librosa, 'output') else None
-                # librosa.output was removed in newer versions, use soundfile
-                import soundfile as sf
-                sf.write(temp_chunk_path, chunk, sr)
-                
-                # Extract features
-                feat = processor.extract_features(temp_chunk_path).flatten()
+            for feat in load_source_features(s, store, pool, chunk_length, overlap):
+                feat = np.array(feat)
                 X.append(feat)
                 y.append(1)
                 
@@ -72,15 +97,10 @@ def train_smart_model():
     for s in human_refs:
         if os.path.exists(s):
             print(f"Processing Human Source (Chunking): {s}")
-            chunks, sr = extract_chunks(s, chunk_length, overlap)
             
             # Humans need more diversity
-            for chunk in chunks:
-                temp_chunk_path = "temp_training_chunk_h.wav"
-                import soundfile as sf
-                sf.write(temp_chunk_path, chunk, sr)
-                
-                feat = processor.extract_features(temp_chunk_path).flatten()
+            for feat in load_source_features(s, store, pool, chunk_length, overlap):
+                feat = np.array(feat)
                 X.append(feat)
                 y.append(0)
                 
@@ -91,6 +111,8 @@ def train_smart_model():
                     X.append(noisy_feat)
                     y.append(0)
 
+    pool.shutdown()
+
     # 3. EXTRA SYNTHETIC NEGATIVES (Robotic Patterns)
     # Generate random features with "AI-like" spectral flatness patterns
     print("Synthesizing algorithmic patterns...")
@@ -114,7 +136,19 @@ def train_smart_model():
     X = X[indices]
     y = y[indices]
 
-    print("--- Phase 2: Training Deeper Ensemble model ---")
+    # Keep the families that carry nearly all of the importance; the others are zeroed here exactly as
+    # serving leaves them, so skipping them (tonnetz needs HPSS) cannot shift any prediction
+    print("--- Phase 2: Selecting Feature Families ---")
+    selector = ExtraTreesClassifier(n_estimators=200, class_weight='balanced', n_jobs=-1, random_state=42)
+    selector.fit(StandardScaler().fit_transform(X), y)
+    cutoff = float(os.getenv('FEATURE_IMPORTANCE_CUTOFF', 0.98))
+    families, dropped_share = select_feature_families(selector.feature_importances_, cutoff)
+    skipped = [name for name in FEATURE_FAMILIES if name not in families]
+    print(f"Keeping {len(families)} of {len(FEATURE_FAMILIES)} families at a {cutoff*100:g}% importance cutoff; "
+          f"dropped {', '.join(skipped) or 'none'} ({dropped_share*100:.2f}% of the importance)")
+    X = mask_families(X, families)
+
+    print("--- Phase 3: Training Deeper Ensemble model ---")
 
     # Scale
     scaler = StandardScaler()
@@ -135,15 +169,67 @@ def train_smart_model():
     score = model.score(X_scaled, y)
     print(f"Training Accuracy: {score*100:.2f}%")
 
+    save_and_publish(model, scaler, X, y, {"training_accuracy": round(float(score), 4), "samples": int(len(X)),
+                                           "dropped_importance_share": round(dropped_share, 6)},
+                     families=families, importances=selector.feature_importances_)
+
+def save_and_publish(model, scaler, X, y, metadata, families=None, importances=None, cascade=None):
+    """Saves the forest and scaler, fits the cascade first stage on (X, y), exports the compiled
+    copy and feature manifest, and publishes the bundle as a new registry version.
+    X must already be masked to `families` (None: all). A given (cascade_model, cascade_scaler)
+    pair is kept as is instead of being refitted on (X, y).
+    """
+    X_scaled = scaler.transform(X)
+
     # Save
     os.makedirs('models', exist_ok=True)
     joblib.dump(model, 'models/model.pkl')
     joblib.dump(scaler, 'models/scaler.pkl')
+
+    # Cascade first stage: a small forest on the cheap MFCC + flatness families only
+    print("--- Phase 4: Training Cascade First Stage ---")
+    cascade_columns = family_indices(CASCADE_FAMILIES)
+    if cascade is None:
+        cascade_scaler = StandardScaler()
+        X_cascade = cascade_scaler.fit_transform(X[:, cascade_columns])
+        cascade_model = ExtraTreesClassifier(
+            n_estimators=100,
+            max_depth=12,
+            min_samples_leaf=2,
+            class_weight='balanced',
+            n_jobs=-1,
+            random_state=42
+        )
+        cascade_model.fit(X_cascade, y)
+    else:
+        print("Keeping the existing cascade first stage")
+        cascade_model, cascade_scaler = cascade
+        X_cascade = cascade_scaler.transform(X[:, cascade_columns])
+
+    cascade_threshold = float(os.getenv('CASCADE_THRESHOLD', 0.9))
+    cascade_proba = cascade_model.predict_proba(X_cascade)
+    confident = cascade_proba.max(axis=1) >= cascade_threshold
+    agreement = cascade_model.classes_[np.argmax(cascade_proba, axis=1)] == model.predict(X_scaled)
+    print(f"Cascade early exit at {cascade_threshold}: {confident.mean()*100:.1f}% of training clips, "
+          f"agreeing with the full model on {agreement[confident].mean()*100 if confident.any() else 0:.2f}%")
+    joblib.dump(cascade_model, 'models/cascade_model.pkl')
+    joblib.dump(cascade_scaler, 'models/cascade_scaler.pkl')
     
-    # Clean up
-    if os.path.exists("temp_training_chunk.wav"): os.remove("temp_training_chunk.wav")
-    if os.path.exists("temp_training_chunk_h.wav"): os.remove("temp_training_chunk_h.wav")
-    
+    # Flat-array copy of the forest for fast serving
+    compiled = export_compiled_model()
+
+    # Record which feature families the forest was trained on, so serving can skip the rest
+    manifest = build_feature_manifest(families, importances)
+    save_feature_manifest(manifest, 'models', compiled.meta['source_fingerprint'])
+    skipped = [name for name in FEATURE_FAMILIES if name not in manifest['families']]
+    print(f"Feature manifest: {len(manifest['indices'])} of {X.shape[1]} features used, "
+          f"skipped families: {', '.join(skipped) or 'none'}")
+    metadata = dict(metadata, feature_families=manifest['families'])
+
+    # Keep a versioned copy; serving switches to it once promoted (manage_models.py promote <version>)
+    version = ModelRegistry(os.getenv('MODEL_REGISTRY_DIR', 'models/registry')).publish('models', metadata=metadata)
+    print(f"Published model version {version}")
+
     print("--- Success: Advanced Detection Engine Deployed (256 Features) ---")
 
 if __name__ == "__main__":
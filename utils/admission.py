@@ -0,0 +1,151 @@
+import math
+import multiprocessing
+import os
+import time
+from utils.shared_counter import SharedCounter
+
+
+class Rejected(Exception):
+    """A request turned away before doing its work; carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, message, status, retry_after, reason):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        self.reason = reason
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with bursts up to `burst`.
+    The state lives in shared memory: created before gunicorn forks (preload_app), every worker
+    draws from the same bucket.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        # [tokens, monotonic time of the last update]; CLOCK_MONOTONIC is system-wide, so valid across workers
+        self._state = multiprocessing.Array('d', [burst, time.monotonic()])
+
+    def take(self):
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        with self._state.get_lock():
+            now = time.monotonic()
+            tokens = min(self.burst, self._state[0] + (now - self._state[1]) * self.rate)
+            self._state[1] = now
+            if tokens >= 1:
+                self._state[0] = tokens - 1
+                return 0.0
+            self._state[0] = tokens
+            return (1 - tokens) / self.rate
+
+
+class AdmissionController:
+    """Decides early whether a request can finish within its deadline, instead of queueing it until
+    the gunicorn timeout kills it. Checks, in order: the per-API-key token bucket (429), the global
+    in-flight cap (503) and the estimated queue wait (503). After decoding, check_processing() sheds
+    clips whose estimated processing time no longer fits the remaining deadline.
+    Costs are exponentially weighted averages of recent requests, shared by all workers.
+    The queue-wait check only counts requests already running app code, so it only estimates waits
+    where the excess gets that far: async workers (gevent, eventlet) start every accepted request,
+    though only workers x threads make progress at once. Under sync and gthread workers the excess
+    waits in the socket backlog or gthread's connection queue, invisible here; deadline() charges
+    that time only when the proxy sends X-Request-Start.
+    """
+
+    def __init__(self, api_keys, rate_per_key=0.0, burst=None, max_in_flight=0, capacity=1,
+                 default_deadline=60.0, smoothing=0.2):
+        burst = burst or max(1.0, rate_per_key)
+        self.buckets = {key: TokenBucket(rate_per_key, burst) for key in api_keys if key} if rate_per_key > 0 else {}
+        self.max_in_flight = max_in_flight
+        # Requests served concurrently (workers x threads); the rest wait in line
+        self.capacity = max(1, capacity)
+        self.default_deadline = default_deadline
+        self.smoothing = smoothing
+        # Counted per worker pid, so the gunicorn master can release the slots of a worker that died
+        self._in_flight = SharedCounter()
+        # [seconds per request, processing seconds per second of audio]
+        self._costs = multiprocessing.Array('d', [0.0, 0.0])
+
+    def deadline(self, deadline_header=None, request_start_header=None):
+        """Seconds this request may still take: X-Request-Deadline (seconds) or the default, minus the
+        time it already spent queued in front of the app when a proxy sets X-Request-Start.
+        """
+        try:
+            deadline = float(deadline_header) if deadline_header else self.default_deadline
+        except ValueError:
+            deadline = self.default_deadline
+        if deadline <= 0:
+            deadline = self.default_deadline
+
+        if request_start_header:
+            try:
+                started = float(request_start_header.strip().lstrip('t='))
+            except ValueError:
+                started = None
+            if started:
+                # Proxies send seconds, milliseconds or microseconds since the epoch
+                while started > 1e11:
+                    started /= 1000.0
+                deadline -= max(0.0, time.time() - started)
+        return deadline
+
+    def admit(self, api_key, deadline):
+        """Takes an in-flight slot or raises Rejected. Every admitted request must call release()."""
+        bucket = self.buckets.get(api_key)
+        if bucket is not None:
+            wait = bucket.take()
+            if wait:
+                raise Rejected("Rate limit exceeded for this API key", 429, wait, "rate_limit")
+
+        with self._in_flight.get_lock():
+            in_flight = self._in_flight.value
+            wait = self.queue_wait(in_flight)
+            if self.max_in_flight and in_flight >= self.max_in_flight:
+                raise Rejected(f"Server at capacity ({in_flight} requests in flight)", 503,
+                               wait or self._costs[0], "in_flight")
+            if wait > deadline:
+                raise Rejected(f"Estimated queue wait {wait:.1f}s exceeds the {deadline:.1f}s deadline", 503,
+                               wait, "queue_wait")
+            self._in_flight.try_increment()
+
+    def release(self):
+        self._in_flight.decrement()
+
+    def release_all(self):
+        """Gives back every slot held by this process, e.g. from gunicorn's worker_abort."""
+        self._in_flight.release_pid(os.getpid())
+
+    def release_worker(self, pid):
+        """Called by the gunicorn master when a worker exits, however it died."""
+        self._in_flight.release_pid(pid)
+
+    def queue_wait(self, in_flight):
+        """Estimated seconds before a new request starts, with in_flight requests ahead of it."""
+        waiting = in_flight + 1 - self.capacity
+        return waiting * self._costs[0] / self.capacity if waiting > 0 else 0.0
+
+    def check_processing(self, audio_seconds, remaining):
+        """Raises Rejected if a clip of audio_seconds is expected to take longer than remaining seconds."""
+        estimate = audio_seconds * self._costs[1]
+        if estimate > remaining:
+            raise Rejected(f"Estimated processing time {estimate:.1f}s exceeds the remaining "
+                           f"{max(0.0, remaining):.1f}s of the deadline", 503,
+                           self.queue_wait(self._in_flight.value), "deadline")
+
+    def record(self, elapsed, audio_seconds):
+        """Feeds one completed request into the shared cost averages."""
+        samples = [elapsed, elapsed / audio_seconds if audio_seconds > 0 else 0.0]
+        with self._costs.get_lock():
+            for index, sample in enumerate(samples):
+                previous = self._costs[index]
+                self._costs[index] = sample if previous == 0 else previous + self.smoothing * (sample - previous)
+
+    def status(self):
+        return {
+            "in_flight": self._in_flight.value,
+            "max_in_flight": self.max_in_flight,
+            "capacity": self.capacity,
+            "seconds_per_request": round(self._costs[0], 4),
+            "seconds_per_audio_second": round(self._costs[1], 4)
+        }
@@ -1,37 +1,126 @@
 import base64
+import io
 import os
+import shutil
+import subprocess
+import threading
 import uuid
 from pydub import AudioSegment
 import librosa
 import numpy as np
+from utils.feature_engine import SpectralFeatureEngine
+from utils.ffmpeg_pool import FFmpegPool
+
+# Resampling quality tiers, named after librosa's res_type:
+# (ffmpeg aresample options with libsoxr, options for builds without it, soxr streaming quality)
+RESAMPLE_QUALITIES = {
+    'soxr_vhq': ('resampler=soxr:precision=28', 'filter_size=64:phase_shift=12', 'VHQ'),
+    'soxr_hq': ('resampler=soxr:precision=20', 'filter_size=32:phase_shift=10', 'HQ'),
+    'soxr_mq': ('resampler=soxr:precision=16', 'filter_size=24:phase_shift=8', 'MQ'),
+    'soxr_lq': ('resampler=soxr:precision=16:cutoff=0.8', 'filter_size=16:phase_shift=6', 'LQ'),
+    'polyphase': ('filter_size=16:phase_shift=6', 'filter_size=16:phase_shift=6', 'LQ'),
+}
+
+# Plain average of the input channels, like librosa.to_mono and _sndfile_decode. '-ac 1' alone lets
+# libswresample sum stereo at 0.707 per channel, about 3 dB hotter for float output; '<' renormalizes
+# the gains over the channels the input actually has (mono: c0, stereo: (c0 + c1) / 2, ...)
+DOWNMIX_FILTER = 'pan=mono|c0<' + '+'.join(f'c{channel}' for channel in range(8))
+
+# Containers libsndfile decodes in-process; everything else (mp3, AAC, ...) goes through ffmpeg
+SNDFILE_FORMATS = {'wav', 'flac', 'ogg', 'aiff'}
+
+
+def sniff_format(header):
+    """Identifies the container from its first 12 bytes (see check_headers.py); None if unknown."""
+    header = bytes(header[:12])
+    if header[:4] in (b'RIFF', b'RF64') and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] == b'fLaC':
+        return 'flac'
+    if header[:4] == b'OggS':
+        return 'ogg'
+    if header[:4] == b'FORM' and header[8:12] in (b'AIFF', b'AIFC'):
+        return 'aiff'
+    if header[:3] == b'ID3':
+        return 'mp3'
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0:
+        # MPEG audio frame sync; layer bits 00 mark an ADTS AAC stream instead
+        return 'aac' if header[1] & 0x06 == 0 else 'mp3'
+    return None
+
 
 class AudioProcessor:
-    def __init__(self, temp_dir='temp_audio'):
+    def __init__(self, temp_dir='temp_audio', sample_rate=22050, resample_quality='soxr_hq', vad=False,
+                 ffmpeg_pool_size=0):
+        if resample_quality not in RESAMPLE_QUALITIES:
+            raise ValueError(f"Unknown resample quality '{resample_quality}', expected one of {sorted(RESAMPLE_QUALITIES)}")
         self.temp_dir = temp_dir
+        self.sample_rate = sample_rate
+        self.resample_quality = resample_quality
+        # Drop silence and background noise in analyze() before any feature family runs
+        self.vad = vad
+        self._engines = {}
+        self._ffmpeg_soxr = None
+        self._ffmpeg_path = None
+        # Number of prespawned ffmpeg decoders for formats libsndfile can't read (0 = spawn per request)
+        self.ffmpeg_pool_size = ffmpeg_pool_size
+        self._ffmpeg_pool = None
         os.makedirs(self.temp_dir, exist_ok=True)
 
+    def _ffmpeg_output_args(self):
+        """Asks ffmpeg for mono float at the target rate, so decode, downmix and resample are one pass."""
+        soxr_options, swr_options, _ = RESAMPLE_QUALITIES[self.resample_quality]
+        options = soxr_options if self._ffmpeg_has_soxr() else swr_options
+        return ['-af', f'{DOWNMIX_FILTER},aresample={self.sample_rate}:{options}',
+                '-ac', '1', '-ar', str(self.sample_rate)]
+
+    def _ffmpeg(self):
+        """Path of the ffmpeg binary. The static_ffmpeg command is a Python launcher, so calling the
+        binary it wraps directly saves an interpreter start per decode. Without the package (e.g. the
+        Docker image, which installs the system ffmpeg) the ffmpeg on PATH is used.
+        """
+        if self._ffmpeg_path is None:
+            try:
+                from static_ffmpeg.run import get_or_fetch_platform_executables_else_raise
+                self._ffmpeg_path = get_or_fetch_platform_executables_else_raise()[0]
+            except Exception:
+                self._ffmpeg_path = shutil.which('ffmpeg') or 'static_ffmpeg'
+        return self._ffmpeg_path
+
+    def _ffmpeg_has_soxr(self):
+        """Checked once per process: not every ffmpeg build ships libsoxr."""
+        if self._ffmpeg_soxr is None:
+            try:
+                result = subprocess.run([self._ffmpeg(), '-hide_banner', '-buildconf'],
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=10)
+                self._ffmpeg_soxr = b'--enable-libsoxr' in result.stdout + result.stderr
+            except Exception:
+                self._ffmpeg_soxr = False
+        return self._ffmpeg_soxr
+
     def base64_to_wav(self, base64_string):
         """Decodes base64 audio and saves it. Prefers WAV but keeps original if conversion fails."""
+        return self.bytes_to_wav(self.decode_base64(base64_string))
+
+    def bytes_to_wav(self, audio_data):
+        """Saves raw audio bytes and converts them to WAV on disk."""
         file_id = str(uuid.uuid4())
         mp3_path = os.path.join(self.temp_dir, f"{file_id}.mp3")
         wav_path = os.path.join(self.temp_dir, f"{file_id}.wav")
 
         try:
-            # Decode base64
-            audio_data = base64.b64decode(base64_string)
             with open(mp3_path, "wb") as f:
                 f.write(audio_data)
 
-            # Try static_ffmpeg first as it's more reliable in this environment
+            # Try ffmpeg first (static_ffmpeg's binary or the one on PATH, see _ffmpeg)
             try:
-                import subprocess
-                from static_ffmpeg import run
-                # Use static_ffmpeg to convert
-                subprocess.run(['static_ffmpeg', '-y', '-i', mp3_path, wav_path], 
+                # Write the WAV already mono at the target rate so librosa.load need not resample
+                subprocess.run([self._ffmpeg(), '-y', '-i', mp3_path] + self._ffmpeg_output_args() +
+                               ['-acodec', 'pcm_f32le', wav_path],
                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
                 return wav_path, mp3_path
             except Exception as e:
-                print(f"static_ffmpeg failed, trying pydub: {e}")
+                print(f"ffmpeg failed, trying pydub: {e}")
                 # Attempt conversion to WAV using pydub
                 try:
                     audio = AudioSegment.from_file(mp3_path)
@@ -45,95 +134,266 @@ class AudioProcessor:
             self.cleanup([mp3_path, wav_path])
             raise Exception(f"Audio processing error: {str(e)}")
 
-    def extract_features(self, audio_path):
+    def decode_base64(self, base64_string):
+        """Decodes a base64 payload into the raw bytes of the uploaded file."""
+        try:
+            return base64.b64decode(base64_string)
+        except Exception as e:
+            raise Exception(f"Audio processing error: {str(e)}")
+
+    def bytes_to_array(self, audio_data):
+        """Decodes raw audio bytes into a float32 mono array at self.sample_rate.
+        Nothing is written to temp_dir. WAV/FLAC/OGG/AIFF are decoded in-process by libsndfile;
+        other formats go through ffmpeg reading stdin and writing raw PCM to stdout.
+        """
+        audio_format = sniff_format(audio_data)
+        if audio_format in SNDFILE_FORMATS:
+            try:
+                return self._sndfile_decode(audio_data)
+            except Exception as e:
+                print(f"In-process {audio_format} decode failed, trying ffmpeg: {e}")
+
+        try:
+            # Try ffmpeg first (static_ffmpeg's binary or the one on PATH, see _ffmpeg)
+            try:
+                y = np.frombuffer(self._ffmpeg_decode(audio_data), dtype=np.float32)
+                if len(y) == 0:
+                    raise ValueError("ffmpeg produced no samples")
+                return y
+            except Exception as e:
+                print(f"ffmpeg failed, trying pydub: {e}")
+                # Attempt in-memory decode using pydub
+                try:
+                    audio = AudioSegment.from_file(io.BytesIO(audio_data)).set_channels(1)
+                    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+                    samples /= float(1 << (8 * audio.sample_width - 1))
+                    return librosa.resample(samples, orig_sr=audio.frame_rate, target_sr=self.sample_rate,
+                                            res_type=self.resample_quality)
+                except Exception:
+                    # If conversion fails (e.g. no ffmpeg), let librosa read the buffer directly
+                    y, _ = librosa.load(io.BytesIO(audio_data), sr=self.sample_rate, res_type=self.resample_quality)
+                    return y
+
+        except Exception as e:
+            raise Exception(f"Audio processing error: {str(e)}")
+
+    def ffmpeg_decode_command(self):
+        """ffmpeg arguments that read a file on stdin and write float32 mono PCM at self.sample_rate to stdout."""
+        return ([self._ffmpeg(), '-nostdin', '-i', 'pipe:0'] + self._ffmpeg_output_args() +
+                ['-f', 'f32le', '-acodec', 'pcm_f32le', 'pipe:1'])
+
+    def _ffmpeg_decode(self, audio_data):
+        cmd = self.ffmpeg_decode_command()
+        if self.ffmpeg_pool_size > 0:
+            if self._ffmpeg_pool is None:
+                self._ffmpeg_pool = FFmpegPool(cmd, size=self.ffmpeg_pool_size)
+            return self._ffmpeg_pool.decode(audio_data)
+        return subprocess.run(cmd, input=audio_data, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              check=True).stdout
+
+    def _sndfile_decode(self, audio_data):
+        """Decodes a libsndfile-readable buffer, downmixes and resamples with the selected soxr tier."""
+        import soundfile as sf
+        import soxr
+
+        y, sr = sf.read(io.BytesIO(audio_data), dtype='float32', always_2d=True)
+        y = y.mean(axis=1)
+        if sr != self.sample_rate:
+            y = soxr.resample(y, sr, self.sample_rate, quality=RESAMPLE_QUALITIES[self.resample_quality][2])
+        if len(y) == 0:
+            raise ValueError("no samples decoded")
+        return np.ascontiguousarray(y, dtype=np.float32)
+
+    def stream_blocks(self, source, block_seconds=5.0):
+        """Yields the decoded signal as float32 mono blocks at self.sample_rate.
+        source may be raw bytes, a file path or a readable file object; memory use is bounded by
+        the block size no matter how long the recording is.
+        """
+        block_samples = int(block_seconds * self.sample_rate)
+        decoders = [('ffmpeg', self._ffmpeg_blocks), ('soundfile', self._soundfile_blocks)]
+        if sniff_format(self._peek(source)) in SNDFILE_FORMATS:
+            decoders.reverse()
+
+        for index, (name, decoder) in enumerate(decoders):
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            started = False
+            try:
+                for block in decoder(source, block_samples):
+                    started = True
+                    yield block
+                return
+            except Exception as e:
+                if started or index == len(decoders) - 1:
+                    raise Exception(f"Audio processing error: {str(e)}")
+                print(f"{name} streaming failed, trying {decoders[index + 1][0]}: {e}")
+
+    def _peek(self, source):
+        """First bytes of a stream_blocks source, without consuming it."""
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                return bytes(source[:12])
+            if isinstance(source, (str, os.PathLike)):
+                with open(source, 'rb') as f:
+                    return f.read(12)
+            if hasattr(source, 'seek'):
+                header = source.read(12)
+                source.seek(0)
+                return header
+        except OSError:
+            pass
+        return b''
+
+    def _ffmpeg_blocks(self, source, block_samples):
+        is_path = isinstance(source, (str, os.PathLike))
+        cmd = ([self._ffmpeg(), '-nostdin', '-i', source if is_path else 'pipe:0'] + self._ffmpeg_output_args() +
+               ['-f', 'f32le', '-acodec', 'pcm_f32le', 'pipe:1'])
+        proc = subprocess.Popen(cmd, stdin=None if is_path else subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        writer = None
+        if not is_path:
+            # Feed stdin from a thread so that reading stdout never deadlocks on a full pipe
+            writer = threading.Thread(target=self._feed_stdin, args=(proc.stdin, source), daemon=True)
+            writer.start()
+
+        try:
+            block_bytes = block_samples * 4
+            produced = False
+            while True:
+                # Buffered reads only come back short at EOF
+                chunk = proc.stdout.read(block_bytes)
+                usable = len(chunk) - len(chunk) % 4
+                if not usable:
+                    break
+                produced = True
+                yield np.frombuffer(chunk[:usable], dtype=np.float32)
+            if proc.wait() != 0 and not produced:
+                raise ValueError(f"ffmpeg exited with status {proc.returncode}")
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            if writer is not None:
+                writer.join(timeout=1)
+
+    def _feed_stdin(self, stdin, source):
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                stdin.write(source)
+            else:
+                for chunk in iter(lambda: source.read(1 << 16), b''):
+                    stdin.write(chunk)
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def _soundfile_blocks(self, source, block_samples):
+        import soundfile as sf
+        import soxr
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        with sf.SoundFile(source) as audio:
+            resampler = None
+            if audio.samplerate != self.sample_rate:
+                resampler = soxr.ResampleStream(audio.samplerate, self.sample_rate, 1, dtype='float32',
+                                                quality=RESAMPLE_QUALITIES[self.resample_quality][2])
+            for block in audio.blocks(blocksize=block_samples, dtype='float32', always_2d=True):
+                block = block.mean(axis=1)
+                if resampler is not None:
+                    block = resampler.resample_chunk(block)
+                if len(block):
+                    yield block
+            if resampler is not None:
+                tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+                if len(tail):
+                    yield tail
+
+    def base64_to_array(self, base64_string):
+        """Decodes base64 audio straight to an in-memory float32 mono array."""
+        return self.bytes_to_array(self.decode_base64(base64_string))
+
+    def extract_features(self, audio_path, families=None):
         """Extracts 256+ highly granular features for deep speech analysis.
         Designed to detect AI vs Human even in short (1-word) clips.
         """
+        y, sr = self.load_file(audio_path)
+        return self.extract_features_from_array(y, sr, families)
+
+    def load_file(self, audio_path):
+        """Loads a decoded file as mono float32 at the processor's sample rate."""
         try:
             # Load audio - Resample to 22050 for consistency
-            y, sr = librosa.load(audio_path, sr=22050)
-            
-            # Ensure minimum length for feature extraction (at least 0.5s)
-            if len(y) < sr // 2:
-                # Pad with silence if too short
-                y = np.pad(y, (0, max(0, sr // 2 - len(y))), mode='constant')
-            
-            features = []
-            
-            # 1. MFCCs with high resolution (40 coefficients)
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=40)
-            features.extend(np.mean(mfccs, axis=1)) # 40
-            features.extend(np.std(mfccs, axis=1))  # 40
-            
-            # MFCC Deltas (Velocity of speech transitions)
-            mfcc_delta = librosa.feature.delta(mfccs)
-            features.extend(np.mean(mfcc_delta, axis=1)) # 40
-            
-            # MFCC Delta-Deltas (Acceleration - captures micro-jitters)
-            mfcc_delta2 = librosa.feature.delta(mfccs, order=2)
-            features.extend(np.mean(mfcc_delta2, axis=1)) # 40
-            
-            # 2. Spectral Features (Deep Texture Analysis)
-            # Spectral Flatness (Search for robotic/artificial tones)
-            flatness = librosa.feature.spectral_flatness(y=y)
-            features.append(np.mean(flatness)) # 1
-            features.append(np.std(flatness))  # 1
-            
-            # Spectral Centroid (Brightness/Timbre)
-            centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
-            features.append(np.mean(centroid)) # 1
-            features.append(np.std(centroid))  # 1
-            
-            # Spectral Rolloff (High frequency content)
-            rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)
-            features.append(np.mean(rolloff)) # 1
-            features.append(np.std(rolloff))  # 1
-            
-            # Spectral Bandwidth
-            bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)
-            features.append(np.mean(bandwidth)) # 1
-            features.append(np.std(bandwidth))  # 1
-
-            # 3. Spectral Contrast (Harmonic Peaks vs Valleys)
-            contrast = librosa.feature.spectral_contrast(y=y, sr=sr)
-            features.extend(np.mean(contrast, axis=1)) # 7
-            
-            # 4. Zero Crossing Rate (Check for sharp transients common in AI artifacts)
-            zcr = librosa.feature.zero_crossing_rate(y)
-            features.append(np.mean(zcr)) # 1
-            features.append(np.std(zcr))  # 1
-            
-            # 5. Chroma Features (Pitch/Harmonic structure)
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-            features.extend(np.mean(chroma, axis=1)) # 12
-            
-            # 6. Tonnetz (Inter-harmonic relationships)
-            tonnetz = librosa.feature.tonnetz(y=librosa.effects.harmonic(y), sr=sr)
-            features.extend(np.mean(tonnetz, axis=1)) # 6
-            
-            # 7. RMS Energy (Dynamic Range)
-            rms = librosa.feature.rms(y=y)
-            features.append(np.mean(rms)) # 1
-            features.append(np.std(rms))  # 1
-            
-            # 8. Mel Spectrogram (High resolution energy bands)
-            mel = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=40)
-            features.extend(np.mean(mel, axis=1)) # 40
-            
-            # Final feature count should be consistent
-            # 40+40+40+40 + 2 + 2 + 2 + 2 + 7 + 2 + 12 + 6 + 2 + 40 = 237
-            
-            # Adding Padding/Truncating to ensure exactly 256 features for model stability
-            feat_arr = np.array(features)
-            if len(feat_arr) < 256:
-                feat_arr = np.pad(feat_arr, (0, 256 - len(feat_arr)), mode='constant')
-            else:
-                feat_arr = feat_arr[:256]
-                
-            return feat_arr.reshape(1, -1)
+            return librosa.load(audio_path, sr=self.sample_rate, res_type=self.resample_quality)
         except Exception as e:
             raise Exception(f"Feature extraction error: {str(e)}")
 
+    def extract_features_from_array(self, y, sr, families=None):
+        """Same 256-feature vector as extract_features, computed from an already decoded mono signal.
+        Every feature family is derived from one shared STFT (see utils.feature_engine).
+        With families (e.g. ModelHandler.feature_families) only those are computed; the rest stay zero.
+        """
+        try:
+            # Fixed-length windows (training chunks, stream segments) are never trimmed
+            return self.analyze(y, sr, vad=False).vector(families)
+        except Exception as e:
+            raise Exception(f"Feature extraction error: {str(e)}")
+
+    def analyze(self, y, sr, vad=None):
+        """Returns a lazy ClipAnalysis for the signal, padded to the 0.5s minimum length.
+        With voice-activity trimming (vad, default self.vad) non-speech regions are dropped first
+        and the analysis records the remaining speech_duration.
+        """
+        speech_duration = None
+        if self.vad if vad is None else vad:
+            trimmed = self.trim_silence(y, sr)
+            speech_duration = len(trimmed) / sr
+            # Nothing detected: score the clip as-is rather than half a second of padding
+            if len(trimmed):
+                y = trimmed
+
+        # Ensure minimum length for feature extraction (at least 0.5s)
+        if len(y) < sr // 2:
+            # Pad with silence if too short
+            y = np.pad(y, (0, max(0, sr // 2 - len(y))), mode='constant')
+
+        analysis = self._engine(sr).analyze(y)
+        analysis.speech_duration = speech_duration
+        return analysis
+
+    def trim_silence(self, y, sr, frame_seconds=0.02, hangover_seconds=0.2):
+        """Voice-activity trimming from one cheap pass of frame energy and zero-crossing rate.
+        Frames clearly above the clip's noise floor count as speech, as do quieter frames with a high
+        ZCR (unvoiced consonants); hangover_seconds around each keeps word onsets and tails.
+        Returns the concatenated speech regions (empty if there are none).
+        """
+        frame = int(frame_seconds * sr)
+        n_frames = len(y) // frame
+        if n_frames == 0:
+            return y
+
+        frames = y[:n_frames * frame].reshape(n_frames, frame)
+        energy = np.sqrt(np.mean(frames ** 2, axis=1))
+        zcr = np.mean(np.abs(np.diff(np.signbit(frames), axis=1)), axis=1)
+
+        # 10 dB over the noise floor, but never below -40 dB from the loudest frame
+        threshold = max(np.percentile(energy, 10) * 3.0, np.max(energy) * 0.01, 1e-4)
+        speech = (energy > threshold) | ((energy > threshold * 0.5) & (zcr > 0.25))
+
+        hangover = int(hangover_seconds / frame_seconds)
+        speech = np.convolve(speech, np.ones(2 * hangover + 1))[hangover:hangover + n_frames] > 0
+        return frames[speech].ravel()
+
+    def _engine(self, sr):
+        """Filterbanks are built once per sample rate and reused across clips."""
+        if sr not in self._engines:
+            self._engines[sr] = SpectralFeatureEngine(sr=sr)
+        return self._engines[sr]
+
     def cleanup(self, paths):
         """Deletes temporary files."""
         for path in paths:
@@ -0,0 +1,48 @@
+import numpy as np
+from utils import metrics
+from utils.feature_engine import CASCADE_FAMILIES
+
+
+def classify_analyses(model_handler, analyses, cascade_threshold=None, executor=None):
+    """Classifies ClipAnalysis objects, letting the cheap first stage decide the clips it scores
+    with at least cascade_threshold confidence (None disables the cascade). Only the others pay for
+    the remaining feature families and the full ensemble.
+    Every result carries the "stage" that decided it. Returns (results, error).
+    With an executor, the per-clip feature work runs in parallel.
+    """
+    map_clips = executor.map if executor is not None else map
+    results = [None] * len(analyses)
+    if cascade_threshold is not None and model_handler.has_cascade:
+        with metrics.track_stage('cascade'):
+            rows = np.vstack(list(map_clips(lambda analysis: analysis.subset(CASCADE_FAMILIES), analyses)))
+            first_stage, error = model_handler.predict_first_stage(rows, cascade_threshold)
+        if error:
+            # A broken first stage only costs the early exit
+            metrics.record_error('cascade', 'InferenceError')
+            print(f"Cascade skipped: {error}")
+        else:
+            results = first_stage
+            for result in results:
+                if result is not None:
+                    result["stage"] = "cascade"
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    if pending:
+        # The analyses already hold the shared STFT and the first-stage families
+        with metrics.track_stage('features'):
+            features = np.vstack(list(map_clips(lambda index: analyses[index].vector(model_handler.feature_families),
+                                                pending)))
+        with metrics.track_stage('inference'):
+            predictions, error = model_handler.predict_batch(features)
+        if error:
+            metrics.record_error('inference', 'InferenceError')
+            return None, error
+        for index, prediction in zip(pending, predictions):
+            prediction["stage"] = "full"
+            results[index] = prediction
+
+    for result, analysis in zip(results, analyses):
+        metrics.CASCADE_DECISIONS.labels(stage=result["stage"]).inc()
+        if analysis.speech_duration is not None:
+            result["speech_duration"] = round(analysis.speech_duration, 2)
+    return results, None
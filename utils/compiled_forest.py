@@ -0,0 +1,135 @@
+import json
+import os
+import numpy as np
+
+COMPILED_FORMAT_VERSION = 1
+ARRAY_NAMES = ['scaler_mean', 'scaler_scale', 'feature', 'threshold', 'left', 'right',
+               'leaf_index', 'leaf_values', 'roots', 'classes']
+
+
+class CompiledForest:
+    """A fitted StandardScaler + tree ensemble flattened into contiguous NumPy arrays.
+    Every tree's nodes live in shared arrays; leaves point to themselves so a fixed number of
+    vectorized steps walks all trees for all rows at once.
+    """
+
+    def __init__(self, arrays, meta):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.max_depth = int(meta['max_depth'])
+        self.mmap_mode = None
+
+    @classmethod
+    def from_sklearn(cls, model, scaler):
+        """Compiles a fitted forest classifier (ExtraTrees/RandomForest) and its scaler."""
+        features, thresholds, lefts, rights, leaf_indices, leaf_values, roots = [], [], [], [], [], [], []
+        node_offset = 0
+        leaf_offset = 0
+        max_depth = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            roots.append(node_offset)
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold).astype(np.float64))
+            lefts.append((np.where(is_leaf, nodes, tree.children_left) + node_offset).astype(np.int32))
+            rights.append((np.where(is_leaf, nodes, tree.children_right) + node_offset).astype(np.int32))
+
+            # Normalize leaf counts to class fractions, as DecisionTreeClassifier.predict_proba does
+            values = tree.value[is_leaf, 0, :].astype(np.float64)
+            normalizer = values.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            leaf_values.append(values / normalizer)
+
+            leaf_index = np.full(tree.node_count, -1, dtype=np.int32)
+            leaf_index[is_leaf] = np.arange(is_leaf.sum()) + leaf_offset
+            leaf_indices.append(leaf_index)
+
+            node_offset += tree.node_count
+            leaf_offset += int(is_leaf.sum())
+            max_depth = max(max_depth, tree.max_depth)
+
+        n_features = int(model.n_features_in_)
+        arrays = {
+            'scaler_mean': np.asarray(scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features), dtype=np.float64),
+            'scaler_scale': np.asarray(scaler.scale_ if scaler.scale_ is not None else np.ones(n_features), dtype=np.float64),
+            'feature': np.concatenate(features),
+            'threshold': np.concatenate(thresholds),
+            'left': np.concatenate(lefts),
+            'right': np.concatenate(rights),
+            'leaf_index': np.concatenate(leaf_indices),
+            'leaf_values': np.concatenate(leaf_values),
+            'roots': np.asarray(roots, dtype=np.int32),
+            'classes': np.asarray(model.classes_),
+        }
+        meta = {
+            'format_version': COMPILED_FORMAT_VERSION,
+            'n_estimators': len(model.estimators_),
+            'n_features': n_features,
+            'max_depth': max_depth,
+        }
+        return cls(arrays, meta)
+
+    def save(self, directory, source_fingerprint=None):
+        """Writes one .npy file per array plus meta.json."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        meta = dict(self.meta, source_fingerprint=source_fingerprint)
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        self.meta = meta
+
+    @classmethod
+    def load(cls, directory, mmap_mode=None):
+        """With mmap_mode='r' the arrays stay file-backed, so every process mapping the same
+        files shares one copy of the pages through the OS page cache.
+        """
+        meta = cls.read_meta(directory)
+        if meta is None or meta.get('format_version') != COMPILED_FORMAT_VERSION:
+            raise ValueError(f"No compatible compiled model in {directory}")
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+                  for name in ARRAY_NAMES}
+        compiled = cls(arrays, meta)
+        compiled.mmap_mode = mmap_mode
+        return compiled
+
+    @staticmethod
+    def read_meta(directory):
+        try:
+            with open(os.path.join(directory, 'meta.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAY_NAMES)
+
+    def transform(self, features):
+        """Same arithmetic as StandardScaler.transform, including its in-place dtype handling."""
+        features = np.asarray(features)
+        X = np.array(features, dtype=np.result_type(features.dtype, np.float32), copy=True)
+        X -= self.scaler_mean
+        X /= self.scaler_scale
+        return X
+
+    def predict_proba(self, scaled_features):
+        """Walks every tree for every row in lockstep and averages the leaf class fractions."""
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(scaled_features, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            next_node = np.where(go_left, self.left[node], self.right[node])
+            if np.array_equal(next_node, node):
+                break
+            node = next_node
+
+        return self.leaf_values[self.leaf_index[node]].mean(axis=1)
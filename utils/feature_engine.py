@@ -0,0 +1,178 @@
+from functools import cached_property
+import librosa
+import numpy as np
+
+# Feature families in the order they appear in the model's 256-dim vector
+FEATURE_LAYOUT = [
+    ('mfcc', 160),      # 40 means + 40 stds + 40 delta means + 40 delta-delta means
+    ('flatness', 2),
+    ('centroid', 2),
+    ('rolloff', 2),
+    ('bandwidth', 2),
+    ('contrast', 7),
+    ('zcr', 2),
+    ('chroma', 12),
+    ('tonnetz', 6),
+    ('rms', 2),
+    ('mel', 40),
+]
+FEATURE_SIZE = 256  # 237 real features, zero-padded for model stability
+# Bump whenever the values produced for a clip change, so cached training features are recomputed
+# (2: training rows are stored in float64, like the vectors served)
+FEATURE_VERSION = 2
+# Versions sharing the current 256-dim layout, whose feature manifests therefore still apply
+MANIFEST_COMPATIBLE_VERSIONS = (1, 2)
+FEATURE_FAMILIES = [name for name, _ in FEATURE_LAYOUT]
+# Cheap first stage of the cascade: everything here comes from the shared STFT, no HPSS or chroma
+CASCADE_FAMILIES = ['mfcc', 'flatness']
+
+
+def family_indices(families):
+    """Positions of the given families in the 256-dim vector, in the order given."""
+    slices = family_slices()
+    return np.concatenate([np.arange(slices[name].start, slices[name].stop) for name in families])
+
+
+def family_slices():
+    """Maps each feature family to its slice of the 256-dim vector."""
+    slices = {}
+    start = 0
+    for name, width in FEATURE_LAYOUT:
+        slices[name] = slice(start, start + width)
+        start += width
+    return slices
+
+
+class ClipAnalysis:
+    """Lazily derives every feature family of one clip from a single shared STFT.
+    Each intermediate (STFT, magnitude, power, mel bands, MFCC frames) is computed at most once.
+    """
+
+    def __init__(self, engine, y):
+        self.engine = engine
+        self.y = y
+        self.sr = engine.sr
+        # Seconds of speech left after voice-activity trimming; None when trimming is off
+        self.speech_duration = None
+        self._families = {}
+
+    @cached_property
+    def stft(self):
+        return librosa.stft(self.y, n_fft=self.engine.n_fft, hop_length=self.engine.hop_length)
+
+    @cached_property
+    def magnitude(self):
+        return np.abs(self.stft)
+
+    @cached_property
+    def power(self):
+        return self.magnitude ** 2
+
+    @cached_property
+    def mfcc(self):
+        # Same as librosa.feature.mfcc(y=y): DCT of the dB-scaled 128-band mel spectrogram
+        mel_power = self.engine.mfcc_basis @ self.power
+        return librosa.feature.mfcc(S=librosa.power_to_db(mel_power), n_mfcc=self.engine.n_mfcc)
+
+    @cached_property
+    def mel(self):
+        return self.engine.mel_basis @ self.power
+
+    @cached_property
+    def centroid(self):
+        return librosa.feature.spectral_centroid(S=self.magnitude, sr=self.sr)
+
+    @cached_property
+    def chroma(self):
+        return librosa.feature.chroma_stft(S=self.power, sr=self.sr)
+
+    @cached_property
+    def harmonic(self):
+        # Equivalent to librosa.effects.harmonic(y), but reusing the shared STFT
+        stft_harm = librosa.decompose.hpss(self.stft)[0]
+        return librosa.istft(stft_harm, hop_length=self.engine.hop_length,
+                             length=len(self.y), dtype=self.y.dtype)
+
+    def family(self, name):
+        """Returns the flat feature values of one family."""
+        if name not in self._families:
+            # float64 like the per-feature librosa path the model was trained on (check_feature_parity.py)
+            self._families[name] = np.asarray(getattr(self, f"_compute_{name}")(), dtype=np.float64)
+        return self._families[name]
+
+    def vector(self, families=None):
+        """Builds the (1, 256) model input. Families not requested are left as zeros."""
+        slices = family_slices()
+        feat_arr = np.zeros(FEATURE_SIZE)
+        for name in (FEATURE_FAMILIES if families is None else families):
+            feat_arr[slices[name]] = self.family(name)
+        return feat_arr.reshape(1, -1)
+
+    def subset(self, families):
+        """The given families concatenated into a (1, n) row, e.g. the cascade's first-stage input."""
+        return np.concatenate([self.family(name) for name in families]).reshape(1, -1)
+
+    def _compute_mfcc(self):
+        mfccs = self.mfcc
+        return np.concatenate([
+            np.mean(mfccs, axis=1),
+            np.std(mfccs, axis=1),
+            # Velocity and acceleration of speech transitions
+            np.mean(librosa.feature.delta(mfccs), axis=1),
+            np.mean(librosa.feature.delta(mfccs, order=2), axis=1),
+        ])
+
+    def _compute_flatness(self):
+        flatness = librosa.feature.spectral_flatness(S=self.magnitude)
+        return [np.mean(flatness), np.std(flatness)]
+
+    def _compute_centroid(self):
+        return [np.mean(self.centroid), np.std(self.centroid)]
+
+    def _compute_rolloff(self):
+        rolloff = librosa.feature.spectral_rolloff(S=self.magnitude, sr=self.sr)
+        return [np.mean(rolloff), np.std(rolloff)]
+
+    def _compute_bandwidth(self):
+        bandwidth = librosa.feature.spectral_bandwidth(S=self.magnitude, sr=self.sr, centroid=self.centroid)
+        return [np.mean(bandwidth), np.std(bandwidth)]
+
+    def _compute_contrast(self):
+        return np.mean(librosa.feature.spectral_contrast(S=self.magnitude, sr=self.sr), axis=1)
+
+    def _compute_zcr(self):
+        zcr = librosa.feature.zero_crossing_rate(self.y)
+        return [np.mean(zcr), np.std(zcr)]
+
+    def _compute_chroma(self):
+        return np.mean(self.chroma, axis=1)
+
+    def _compute_tonnetz(self):
+        return np.mean(librosa.feature.tonnetz(y=self.harmonic, sr=self.sr), axis=1)
+
+    def _compute_rms(self):
+        # Time-domain RMS (cheap framing) to stay identical to librosa.feature.rms(y=y)
+        rms = librosa.feature.rms(y=self.y)
+        return [np.mean(rms), np.std(rms)]
+
+    def _compute_mel(self):
+        return np.mean(self.mel, axis=1)
+
+
+class SpectralFeatureEngine:
+    """Holds the per-sample-rate filterbanks and builds ClipAnalysis objects."""
+
+    def __init__(self, sr=22050, n_fft=2048, hop_length=512, n_mfcc=40, n_mels=40):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mfcc = n_mfcc
+        # MFCCs use librosa's default 128-band bank, the mel family a 40-band one
+        self.mfcc_basis = librosa.filters.mel(sr=sr, n_fft=n_fft)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+
+    def analyze(self, y):
+        return ClipAnalysis(self, y)
+
+    def extract(self, y, families=None):
+        return self.analyze(y).vector(families)
@@ -0,0 +1,90 @@
+import json
+import os
+import numpy as np
+from utils.feature_engine import CASCADE_FAMILIES, FEATURE_FAMILIES, FEATURE_SIZE, FEATURE_VERSION, \
+    MANIFEST_COMPATIBLE_VERSIONS, family_indices, family_slices
+
+MANIFEST_NAME = 'feature_manifest.json'
+
+
+def family_importances(importances):
+    """Each family's share of a forest's impurity importance (feature_importances_)."""
+    importances = np.asarray(importances, dtype=np.float64)
+    total = importances.sum() or 1.0
+    slices = family_slices()
+    return {name: float(importances[slices[name]].sum() / total) for name in FEATURE_FAMILIES}
+
+
+def select_feature_families(importances, min_share=0.98, always=CASCADE_FAMILIES):
+    """The fewest families, most important first, that together hold min_share of the importance.
+    Returns (families in vector order, importance share left out).
+    The cascade's families are always kept: serving computes them for the first stage anyway.
+    """
+    shares = family_importances(importances)
+    selected = set(always)
+    covered = sum(shares[name] for name in selected)
+    for name in sorted(FEATURE_FAMILIES, key=lambda name: shares[name], reverse=True):
+        if covered >= min_share:
+            break
+        if name not in selected:
+            selected.add(name)
+            covered += shares[name]
+    families = [name for name in FEATURE_FAMILIES if name in selected]
+    return families, max(0.0, 1.0 - covered)
+
+
+def mask_families(X, families):
+    """Copy of the (n, 256) rows with every family outside `families` zeroed, as serving leaves them."""
+    masked = np.zeros_like(X)
+    if families is None:
+        masked[:] = X
+        return masked
+    columns = family_indices(families)
+    masked[:, columns] = X[:, columns]
+    return masked
+
+
+def build_feature_manifest(families, importances=None):
+    """Lists the feature families (and indices) the forest was trained on; the rest are zeros both
+    in training and at serving. Optionally records each family's share of the selection importance.
+    """
+    families = list(FEATURE_FAMILIES if families is None else families)
+    manifest = {
+        "feature_version": FEATURE_VERSION,
+        "feature_size": FEATURE_SIZE,
+        "families": families,
+        "indices": [int(index) for index in family_indices(families)]
+    }
+    if importances is not None:
+        manifest["family_importances"] = {name: round(share, 6)
+                                          for name, share in family_importances(importances).items()}
+    return manifest
+
+
+def save_feature_manifest(manifest, model_dir='models', source_fingerprint=None):
+    """Writes the manifest next to model.pkl, tagged with the fingerprint of the model it describes."""
+    manifest = dict(manifest, source_fingerprint=source_fingerprint)
+    with open(os.path.join(model_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_feature_families(model_dir='models', model_fingerprint=None):
+    """Returns the families to compute for the loaded model, or None for the full vector:
+    no manifest, a manifest left over from another model, or one from an incompatible feature version.
+    """
+    try:
+        with open(os.path.join(model_dir, MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('feature_version') not in MANIFEST_COMPATIBLE_VERSIONS:
+        print(f"Ignoring {MANIFEST_NAME}: written for feature version {manifest.get('feature_version')}")
+        return None
+    if model_fingerprint and manifest.get('source_fingerprint') not in (None, model_fingerprint):
+        print(f"Ignoring {MANIFEST_NAME}: written for a different model")
+        return None
+
+    families = [name for name in manifest.get('families', []) if name in FEATURE_FAMILIES]
+    return families if len(families) < len(FEATURE_FAMILIES) else None
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import uuid
+import numpy as np
+from utils.feature_engine import FEATURE_VERSION
+
+class FeatureStore:
+    """On-disk cache of per-chunk training features.
+    Each source file gets one shard of rows (one per chunk offset), keyed by the file's content hash,
+    the chunking parameters and the feature-extractor version, so re-runs only featurize new audio.
+    """
+
+    def __init__(self, root='feature_store', version=FEATURE_VERSION):
+        self.root = os.path.join(root, f"v{version}")
+        os.makedirs(self.root, exist_ok=True)
+
+    def shard_key(self, audio_path, chunk_duration, overlap):
+        return f"{self.file_hash(audio_path)}_{int(chunk_duration * 1000)}ms_{int(overlap * 1000)}ms"
+
+    def file_hash(self, audio_path):
+        digest = hashlib.sha256()
+        with open(audio_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()[:24]
+
+    def load(self, key):
+        """Returns (features, offsets) memory-mapped read-only, or None if the shard is missing."""
+        try:
+            features = np.load(self._path(key, 'features'), mmap_mode='r')
+            offsets = np.load(self._path(key, 'offsets'), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        return features, offsets
+
+    def save(self, key, features, offsets):
+        # Offsets first: a shard only counts as present once its features file exists
+        self._atomic_save(self._path(key, 'offsets'), np.asarray(offsets, dtype=np.int64))
+        self._atomic_save(self._path(key, 'features'), np.asarray(features, dtype=np.float64))
+
+    def keys(self):
+        suffix = '.features.npy'
+        return sorted(name[:-len(suffix)] for name in os.listdir(self.root) if name.endswith(suffix))
+
+    def _atomic_save(self, path, array):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    def _path(self, key, kind):
+        return os.path.join(self.root, f"{key}.{kind}.npy")
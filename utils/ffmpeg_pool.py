@@ -0,0 +1,73 @@
+import os
+import queue
+import subprocess
+import threading
+
+
+class FFmpegPool:
+    """Keeps `size` ffmpeg processes started and blocked on stdin, so a request only pays for
+    piping its bytes through one instead of a process spawn. Each process decodes exactly one
+    input and is replaced in the background. After a failed spawn the pool stops refilling until a
+    request manages to start ffmpeg itself, so a missing binary costs no extra thread per request.
+    Processes are only started from the process that uses the pool, never inherited across a fork.
+    """
+
+    def __init__(self, cmd, size=2):
+        self.cmd = cmd
+        self.size = size
+        self._idle = queue.Queue()
+        self._pid = None
+        self._refill_lock = threading.Lock()
+        self._spawn_failed = False
+
+    def decode(self, audio_data):
+        """Runs one input through a ready process and returns its stdout."""
+        proc = self._acquire()
+        stdout, stderr = proc.communicate(audio_data)
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, self.cmd, stdout, stderr)
+        return stdout
+
+    def close(self):
+        while True:
+            try:
+                proc = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            proc.kill()
+            proc.wait()
+
+    def _acquire(self):
+        if self._pid != os.getpid():
+            # First use in this process: inherited Popen objects belong to the parent
+            self._pid = os.getpid()
+            self._idle = queue.Queue()
+            self._spawn_failed = False
+
+        proc = None
+        try:
+            proc = self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        if proc is None or proc.poll() is not None:
+            proc = self._spawn()
+            self._spawn_failed = False
+
+        if not self._spawn_failed:
+            threading.Thread(target=self._refill, daemon=True).start()
+        return proc
+
+    def _refill(self):
+        if not self._refill_lock.acquire(blocking=False):
+            return
+        try:
+            while self._idle.qsize() < self.size:
+                self._idle.put(self._spawn())
+        except OSError as e:
+            self._spawn_failed = True
+            print(f"ffmpeg pool refill failed, refilling paused: {e}")
+        finally:
+            self._refill_lock.release()
+
+    def _spawn(self):
+        return subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
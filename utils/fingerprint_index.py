@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# MFCC frames averaged into one contour step (2 x 512 samples, about 46 ms at 22.05 kHz)
+CONTOUR_HOP = 2
+# Contours keep the first ~30 s; enough to tell recordings apart, bounded per entry
+MAX_CONTOUR_STEPS = 320
+MIN_CONTOUR_STEPS = 8
+
+
+def _unit(vector):
+    return vector / (np.linalg.norm(vector) + 1e-9)
+
+
+def acoustic_fingerprint(analysis):
+    """(summary, contour) of a clip, or None if it is too short to identify.
+    summary: unit vector of the mean and spread of MFCCs 1-12 and of their deltas; unchanged by
+    trimming and close to unchanged by transcoding, used for the cosine lookup.
+    contour: the loudness and first two cepstral tracks over time, each normalised to zero mean and
+    unit variance, so gain and codec colouring cancel; used to verify a candidate up to a time shift.
+    Both come from the MFCC frames the cascade's first stage computes anyway, so a lookup adds no
+    chroma or HPSS work.
+    """
+    mfcc = analysis.mfcc
+    steps = min(mfcc.shape[1] // CONTOUR_HOP, MAX_CONTOUR_STEPS)
+    if steps < MIN_CONTOUR_STEPS:
+        return None
+
+    timbre = mfcc[1:13]
+    motion = np.diff(timbre, axis=1)
+    summary = np.concatenate([_unit(timbre.mean(axis=1)), _unit(timbre.std(axis=1)),
+                              _unit(np.abs(motion).mean(axis=1))]) / np.sqrt(3)
+
+    tracks = mfcc[:3, :steps * CONTOUR_HOP].reshape(3, steps, CONTOUR_HOP).mean(axis=2)
+    contour = (tracks - tracks.mean(axis=1, keepdims=True)) / (tracks.std(axis=1, keepdims=True) + 1e-9)
+    return summary.astype(np.float32), contour.astype(np.float32)
+
+
+def contour_similarity(a, b, max_shift):
+    """Best mean Pearson correlation of two contours over time shifts of up to max_shift steps,
+    counting only shifts where at least half of the shorter contour overlaps.
+    """
+    min_overlap = max(MIN_CONTOUR_STEPS, min(a.shape[1], b.shape[1]) // 2)
+    best = -1.0
+    for lag in range(-max_shift, max_shift + 1):
+        x = a[:, lag:] if lag > 0 else a
+        y = b[:, -lag:] if lag < 0 else b
+        n = min(x.shape[1], y.shape[1])
+        if n < min_overlap:
+            continue
+        x = x[:, :n] - x[:, :n].mean(axis=1, keepdims=True)
+        y = y[:, :n] - y[:, :n].mean(axis=1, keepdims=True)
+        denominator = np.sqrt((x * x).sum(axis=1) * (y * y).sum(axis=1)) + 1e-9
+        best = max(best, float(((x * y).sum(axis=1) / denominator).mean()))
+    return best
+
+
+class FingerprintIndex:
+    """In-memory nearest-neighbour index from acoustic fingerprints to detection results, so
+    transcoded, re-encoded or slightly trimmed copies of a recent clip reuse its verdict.
+    Lookup ranks entries of similar duration by summary cosine, then verifies the best few by
+    contour correlation, which must reach threshold. Holds at most max_entries (least recently
+    matched evicted first) and, like ResultCache, drops everything when the model changes.
+    """
+
+    def __init__(self, max_entries=0, threshold=0.9, summary_threshold=0.9, candidates=5, max_shift_steps=6):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.summary_threshold = summary_threshold
+        self.candidates = candidates
+        # Six steps of ~46 ms tolerate a few hundred ms trimmed off either end
+        self.max_shift_steps = max_shift_steps
+        self._summaries = None
+        self._durations = np.zeros(max(max_entries, 0))
+        # slot -> (contour, result), least recently used first
+        self._entries = OrderedDict()
+        self._free = list(range(max(max_entries, 0) - 1, -1, -1))
+        self._lock = threading.Lock()
+        self._model_fingerprint = None
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def lookup(self, fingerprint, duration, model_fingerprint):
+        """(result, similarity) of the best verified near-duplicate, or None."""
+        summary, contour = fingerprint
+        with self._lock:
+            self._check_model(model_fingerprint)
+            if not self._entries:
+                return None
+
+            slots = np.fromiter(self._entries.keys(), dtype=int, count=len(self._entries))
+            scores = self._summaries[slots] @ summary
+            durations = self._durations[slots]
+            # A few hundred ms trimmed off, or a different encoder delay, but not another recording
+            tolerance = np.maximum(0.5, 0.15 * np.maximum(durations, duration))
+            scores[np.abs(durations - duration) > tolerance] = -1.0
+
+            for index in np.argsort(scores)[::-1][:self.candidates]:
+                if scores[index] < self.summary_threshold:
+                    break
+                slot = int(slots[index])
+                stored_contour, result = self._entries[slot]
+                similarity = contour_similarity(contour, stored_contour, self.max_shift_steps)
+                if similarity >= self.threshold:
+                    self._entries.move_to_end(slot)
+                    return dict(result), similarity
+        return None
+
+    def add(self, fingerprint, duration, model_fingerprint, result):
+        summary, contour = fingerprint
+        with self._lock:
+            self._check_model(model_fingerprint)
+            if self._summaries is None:
+                self._summaries = np.zeros((self.max_entries, len(summary)), dtype=np.float32)
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot, _ = self._entries.popitem(last=False)
+            self._summaries[slot] = summary
+            self._durations[slot] = duration
+            self._entries[slot] = (contour, dict(result))
+
+    def status(self):
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "threshold": self.threshold}
+
+    def _check_model(self, model_fingerprint):
+        """Called with the lock held."""
+        if model_fingerprint != self._model_fingerprint:
+            self._model_fingerprint = model_fingerprint
+            self._entries.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
@@ -0,0 +1,260 @@
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.shared_counter import SharedCounter
+
+# Per-process instances, created once by _init_worker in every pool process
+_worker_processor = None
+_worker_models = None
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobTimeout(BaseException):
+    """BaseException so that the broad `except Exception` fallbacks in the decode path cannot swallow it."""
+
+
+class JobCancelled(BaseException):
+    pass
+
+
+def _write_record(path, record):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, path)
+
+
+def _read_record(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _init_worker(model_path, scaler_path):
+    """Builds the AudioProcessor and ModelHandler once per pool process."""
+    global _worker_processor, _worker_models
+    from utils.audio_processor import AudioProcessor
+    from utils.model_registry import ModelRegistry, ModelManager
+
+    # Let the parent handle Ctrl+C; workers are shut down through the executor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_processor = AudioProcessor(resample_quality=os.getenv('RESAMPLE_QUALITY', 'soxr_hq'),
+                                       vad=os.getenv('VAD_ENABLED', '0') == '1',
+                                       ffmpeg_pool_size=int(os.getenv('FFMPEG_POOL_SIZE', 0)))
+    # Follows the registry's CURRENT version like the web workers do
+    _worker_models = ModelManager(ModelRegistry(os.getenv('MODEL_REGISTRY_DIR', 'models/registry')),
+                                  model_path=model_path, scaler_path=scaler_path,
+                                  poll_interval=float(os.getenv('MODEL_POLL_SECONDS', 5)))
+
+
+def _cascade_threshold():
+    if os.getenv('CASCADE_ENABLED', '1') != '1':
+        return None
+    return float(os.getenv('CASCADE_THRESHOLD', 0.9))
+
+
+def _on_alarm(signum, frame):
+    raise JobTimeout()
+
+
+def _check_cancelled(cancel_path):
+    if os.path.exists(cancel_path):
+        raise JobCancelled()
+
+
+def _run_job(record_path, cancel_path, audio_data, mode, options, timeout):
+    """Executes one job inside a pool process and returns (status, result, error)."""
+    from utils.segment_scorer import SegmentScorer
+    from utils.cascade import classify_analyses
+
+    record = _read_record(record_path) or {}
+    # The job runs on the pool process's main thread, so SIGALRM can interrupt it
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        _check_cancelled(cancel_path)
+        record.update(status="running", started_at=time.time())
+        _write_record(record_path, record)
+        model_handler = _worker_models.active
+
+        if mode == 'segments':
+            scorer = SegmentScorer(_worker_processor, model_handler, **options)
+            # Long recordings: honour a cancel request between scoring batches, not only before starting
+            result = scorer.score(audio_data, on_batch=lambda: _check_cancelled(cancel_path))
+            result["model_version"] = model_handler.version
+            return "succeeded", result, None
+
+        y = _worker_processor.bytes_to_array(audio_data)
+        _check_cancelled(cancel_path)
+        analysis = _worker_processor.analyze(y, _worker_processor.sample_rate)
+        results, error = classify_analyses(model_handler, [analysis], _cascade_threshold())
+        if error:
+            return "failed", None, error
+        result = results[0]
+        result["model_version"] = model_handler.version
+        return "succeeded", result, None
+    except JobTimeout:
+        return "timeout", None, f"Job exceeded its {timeout}s timeout"
+    except JobCancelled:
+        return "cancelled", None, None
+    except Exception as e:
+        return "failed", None, f"Internal process error: {str(e)}"
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class JobManager:
+    """Runs detection jobs on a bounded process pool.
+    Job records live as JSON files in job_dir so any gunicorn worker can report status,
+    and cancellation is a marker file that the owning pool process checks between stages.
+    max_queue bounds the jobs queued or running across all gunicorn workers (the count is shared
+    when the manager is created before the fork); max_workers is the pool size of each gunicorn
+    worker, which starts its own pool on first use.
+    """
+
+    def __init__(self, job_dir='jobs', max_workers=2, max_queue=16, timeout=300, ttl=3600,
+                 model_path='models/model.pkl', scaler_path='models/scaler.pkl', start_method='spawn'):
+        self.job_dir = job_dir
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.ttl = ttl
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.start_method = start_method
+        self._executor = None
+        self._futures = {}
+        self._queued = SharedCounter()
+        self._lock = threading.Lock()
+        os.makedirs(self.job_dir, exist_ok=True)
+
+    def submit(self, audio_data, mode='detect', options=None, timeout=None):
+        """Queues a job and returns its record immediately. Raises QueueFull when at capacity."""
+        timeout = min(float(timeout or self.timeout), self.timeout)
+        job_id = uuid.uuid4().hex
+        record = {
+            "job_id": job_id,
+            "status": "queued",
+            "mode": mode,
+            "created_at": time.time(),
+            "timeout": timeout
+        }
+
+        if not self._queued.try_increment(self.max_queue):
+            raise QueueFull(f"Job queue is full ({self.max_queue} jobs in flight)")
+        try:
+            with self._lock:
+                _write_record(self._record_path(job_id), record)
+                future = self._submit_locked(job_id, audio_data, mode, options or {}, timeout)
+                self._futures[job_id] = future
+        except BaseException:
+            self._queued.decrement()
+            raise
+
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        self._prune()
+        return record
+
+    def get(self, job_id):
+        if not self._valid_id(job_id):
+            return None
+        return _read_record(self._record_path(job_id))
+
+    def cancel(self, job_id):
+        """Cancels a queued job outright; a running job stops at its next stage boundary."""
+        record = self.get(job_id)
+        if record is None or record["status"] not in ("queued", "running"):
+            return record
+
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            return self.get(job_id)
+
+        # Owned by another worker, or already running: leave a marker for the pool process
+        open(self._cancel_path(job_id), 'w').close()
+        record["cancel_requested"] = True
+        return record
+
+    @property
+    def in_flight(self):
+        """Jobs queued or running across all gunicorn workers."""
+        return self._queued.value
+
+    def release_worker(self, pid):
+        """Called by the gunicorn master when a worker exits: its jobs died with it."""
+        self._queued.release_pid(pid)
+
+    def _submit_locked(self, job_id, audio_data, mode, options, timeout):
+        if self._executor is None:
+            # Created lazily so gunicorn workers never inherit a pool forked from the master
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(self.model_path, self.scaler_path)
+            )
+        try:
+            return self._executor.submit(_run_job, self._record_path(job_id), self._cancel_path(job_id),
+                                         audio_data, mode, options, timeout)
+        except BrokenProcessPool:
+            # A crashed pool process breaks the executor; start a fresh one
+            self._executor = None
+            return self._submit_locked(job_id, audio_data, mode, options, timeout)
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        self._queued.decrement()
+
+        record = self.get(job_id) or {"job_id": job_id}
+        if future.cancelled():
+            status, result, error = "cancelled", None, None
+        else:
+            try:
+                status, result, error = future.result()
+            except Exception as e:
+                status, result, error = "failed", None, f"Job worker crashed: {str(e)}"
+
+        record.update(status=status, finished_at=time.time())
+        if result is not None:
+            record["result"] = result
+        if error is not None:
+            record["error"] = error
+        _write_record(self._record_path(job_id), record)
+
+        try:
+            os.remove(self._cancel_path(job_id))
+        except OSError:
+            pass
+
+    def _prune(self):
+        """Drops records of jobs that finished more than ttl seconds ago."""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.job_dir):
+            path = os.path.join(self.job_dir, name)
+            try:
+                if name.endswith('.json') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _valid_id(self, job_id):
+        return len(job_id) == 32 and all(c in '0123456789abcdef' for c in job_id)
+
+    def _record_path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def _cancel_path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.cancel")
@@ -0,0 +1,80 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+
+# Latency buckets from 5 ms to 2 min (the gunicorn timeout)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+DURATION_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 900, 1800)
+
+STAGE_LATENCY = Histogram(
+    'voice_detect_stage_seconds', 'Latency of each /detect pipeline stage',
+    ['stage'], buckets=LATENCY_BUCKETS)
+REQUEST_LATENCY = Histogram(
+    'voice_detect_request_seconds', 'End-to-end latency per endpoint',
+    ['endpoint'], buckets=LATENCY_BUCKETS)
+INPUT_DURATION = Histogram(
+    'voice_detect_input_duration_seconds', 'Duration of decoded uploads',
+    buckets=DURATION_BUCKETS)
+ERRORS = Counter(
+    'voice_detect_errors_total', 'Failures by stage and exception type',
+    ['stage', 'type'])
+CACHE_LOOKUPS = Counter(
+    'voice_detect_cache_lookups_total', 'Result cache lookups by outcome',
+    ['result'])
+NEAR_DUPLICATE_LOOKUPS = Counter(
+    'voice_detect_near_duplicate_lookups_total', 'Acoustic fingerprint index lookups by outcome',
+    ['result'])
+CASCADE_DECISIONS = Counter(
+    'voice_detect_cascade_decisions_total', 'Clips classified per cascade stage (early-exit rate)',
+    ['stage'])
+SHADOW_PREDICTIONS = Counter(
+    'voice_detect_shadow_predictions_total', 'Shadow model predictions compared with the served model',
+    ['outcome'])
+ADMISSION_REJECTIONS = Counter(
+    'voice_detect_admission_rejections_total', 'Requests shed by admission control',
+    ['reason'])
+IN_FLIGHT = Gauge(
+    'voice_detect_in_flight_requests', 'Requests currently being processed',
+    ['endpoint'], multiprocess_mode='livesum')
+
+
+@contextmanager
+def track_stage(stage):
+    """Times a pipeline stage and counts its failures by exception type."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        ERRORS.labels(stage=stage, type=type(e).__name__).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage=stage).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def track_request(endpoint):
+    IN_FLIGHT.labels(endpoint=endpoint).inc()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        REQUEST_LATENCY.labels(endpoint=endpoint).observe(time.perf_counter() - started)
+        IN_FLIGHT.labels(endpoint=endpoint).dec()
+
+
+def record_error(stage, error_type):
+    ERRORS.labels(stage=stage, type=error_type).inc()
+
+
+def render():
+    """Prometheus text exposition. With PROMETHEUS_MULTIPROC_DIR set (see gunicorn.conf.py),
+    the samples of every gunicorn worker are aggregated.
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        from prometheus_client import REGISTRY as registry
+    return generate_latest(registry), CONTENT_TYPE_LATEST
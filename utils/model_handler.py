@@ -1,46 +1,178 @@
+import hashlib
 import joblib
 import os
+import time
+import numpy as np
+from utils.compiled_forest import CompiledForest
+from utils.feature_manifest import load_feature_families
+
+def file_fingerprint(paths):
+    """Content hash of the model artifacts, used to key cached results."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+    return digest.hexdigest()[:16]
 
 class ModelHandler:
-    def __init__(self, model_path='models/model.pkl', scaler_path='models/scaler.pkl'):
+    def __init__(self, model_path='models/model.pkl', scaler_path='models/scaler.pkl', use_compiled=True, mmap_mode='r'):
         self.model_path = model_path
         self.scaler_path = scaler_path
+        self.compiled_dir = os.path.join(os.path.dirname(model_path), 'compiled')
+        self.cascade_model_path = os.path.join(os.path.dirname(model_path), 'cascade_model.pkl')
+        self.cascade_scaler_path = os.path.join(os.path.dirname(model_path), 'cascade_scaler.pkl')
+        self.use_compiled = use_compiled
+        self.mmap_mode = mmap_mode
+        self.load_time_ms = None
+        self.size_bytes = 0
         self.model = None
         self.scaler = None
+        self.compiled = None
+        self.cascade_model = None
+        self.cascade_scaler = None
+        self.classes_ = None
+        self.fingerprint = None
+        # Registry version name, set by ModelRegistry.load
+        self.version = None
+        # Feature families the model needs; None means the full 256-dim vector
+        self.feature_families = None
         self.load_models()
 
+    @property
+    def is_loaded(self):
+        return self.compiled is not None or (self.model is not None and self.scaler is not None)
+
+    @property
+    def has_cascade(self):
+        return self.is_loaded and self.cascade_model is not None and self.cascade_scaler is not None
+
     def load_models(self):
-        """Loads the saved models from disk."""
+        """Loads the saved models from disk.
+        Prefers the compiled flat-array forest when it was exported from the current .pkl files,
+        which skips unpickling the sklearn object graph entirely.
+        """
+        started = time.perf_counter()
+        try:
+            self._load()
+            self._load_cascade()
+            self.feature_families = load_feature_families(os.path.dirname(self.model_path), self.fingerprint)
+        finally:
+            self.load_time_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    def _load(self):
+        has_pickles = os.path.exists(self.model_path) and os.path.exists(self.scaler_path)
+        self.fingerprint = file_fingerprint([self.model_path, self.scaler_path])
+
+        compiled_meta = CompiledForest.read_meta(self.compiled_dir) if self.use_compiled else None
+        if compiled_meta and (not has_pickles or compiled_meta.get('source_fingerprint') == self.fingerprint):
+            try:
+                self.compiled = CompiledForest.load(self.compiled_dir, mmap_mode=self.mmap_mode)
+                self.classes_ = self.compiled.classes
+                self.size_bytes = self.compiled.nbytes
+                if not has_pickles:
+                    self.fingerprint = compiled_meta.get('source_fingerprint') or self.fingerprint
+                return
+            except Exception as e:
+                print(f"Compiled model could not be loaded, falling back to pickles: {e}")
+
         if os.path.exists(self.model_path):
             self.model = joblib.load(self.model_path)
+            self.classes_ = self.model.classes_
+            self.size_bytes += os.path.getsize(self.model_path)
         if os.path.exists(self.scaler_path):
             self.scaler = joblib.load(self.scaler_path)
+            self.size_bytes += os.path.getsize(self.scaler_path)
+
+    def _load_cascade(self):
+        """The small first-stage model is optional; without it every clip takes the full path."""
+        if os.path.exists(self.cascade_model_path) and os.path.exists(self.cascade_scaler_path):
+            self.cascade_model = joblib.load(self.cascade_model_path)
+            self.cascade_scaler = joblib.load(self.cascade_scaler_path)
+            self.size_bytes += os.path.getsize(self.cascade_model_path)
+
+    def predict_first_stage(self, rows, threshold):
+        """Scores cascade rows (see feature_engine.CASCADE_FAMILIES) with the small model.
+        Returns (results, error); results holds None for every clip whose confidence is below threshold.
+        """
+        if not self.has_cascade:
+            return None, "Cascade model not loaded"
+
+        try:
+            probabilities = self.cascade_model.predict_proba(self.cascade_scaler.transform(np.asarray(rows)))
+            predictions = self.cascade_model.classes_[np.argmax(probabilities, axis=1)]
+
+            return [self._format_result(prediction, probs) if max(probs) >= threshold else None
+                    for prediction, probs in zip(predictions, probabilities)], None
+        except Exception as e:
+            return None, f"Inference error: {str(e)}"
 
     def predict(self, features):
         """Runs inference on extracted features."""
-        if self.model is None or self.scaler is None:
+        if not self.is_loaded:
+            return None, "Model or Scaler not loaded. Please ensure .pkl files are in models/ directory."
+
+        # Print features for debugging
+        print(f"DEBUG: Features Shape: {features.shape}")
+        print(f"DEBUG: First 5 features: {features[0][:5]}")
+
+        results, error = self.predict_batch(features)
+        if error:
+            return None, error
+        return results[0], None
+
+    def predict_batch(self, features):
+        """Scores a (n_clips, 256) matrix with one scaler.transform and one predict_proba call."""
+        if not self.is_loaded:
             return None, "Model or Scaler not loaded. Please ensure .pkl files are in models/ directory."
 
         try:
-            # Print features for debugging
-            print(f"DEBUG: Features Shape: {features.shape}")
-            print(f"DEBUG: First 5 features: {features[0][:5]}")
-            
-            # Scale features
-            scaled_features = self.scaler.transform(features)
-            
-            # Predict
-            prediction = self.model.predict(scaled_features)[0]
-            probabilities = self.model.predict_proba(scaled_features)[0]
-            
-            # Assuming 0 is HUMAN and 1 is AI_GENERATED based on PRD logic
-            # Confidence is the probability of the predicted class
-            confidence = float(max(probabilities))
-            label = "AI_GENERATED" if prediction == 1 else "HUMAN"
-            
-            return {
-                "classification": label,
-                "confidence": round(confidence, 2)
-            }, None
+            probabilities = self._predict_proba(features)
+
+            # The label is the argmax class, exactly what model.predict returns
+            predictions = self.classes_[np.argmax(probabilities, axis=1)]
+
+            return [self._format_result(prediction, probs)
+                    for prediction, probs in zip(predictions, probabilities)], None
         except Exception as e:
             return None, f"Inference error: {str(e)}"
+
+    def ai_probabilities(self, features):
+        """Returns the AI_GENERATED probability of every row, for callers that aggregate scores."""
+        if not self.is_loaded:
+            return None, "Model or Scaler not loaded. Please ensure .pkl files are in models/ directory."
+
+        try:
+            probabilities = self._predict_proba(features)
+            ai_column = list(self.classes_).index(1)
+            return probabilities[:, ai_column], None
+        except Exception as e:
+            return None, f"Inference error: {str(e)}"
+
+    def transform(self, features):
+        """Applies the fitted scaler."""
+        if self.compiled is not None:
+            return self.compiled.transform(features)
+        return self.scaler.transform(np.asarray(features))
+
+    def predict_proba_scaled(self, scaled_features):
+        """Class probabilities for already scaled rows, ordered like classes_."""
+        if self.compiled is not None:
+            # One vectorized pass over the flat arrays yields both label and confidence
+            return self.compiled.predict_proba(scaled_features)
+        return self.model.predict_proba(scaled_features)
+
+    def _predict_proba(self, features):
+        return self.predict_proba_scaled(self.transform(features))
+
+    def _format_result(self, prediction, probabilities):
+        # Assuming 0 is HUMAN and 1 is AI_GENERATED based on PRD logic
+        # Confidence is the probability of the predicted class
+        confidence = float(max(probabilities))
+        label = "AI_GENERATED" if prediction == 1 else "HUMAN"
+
+        return {
+            "classification": label,
+            "confidence": round(confidence, 2)
+        }
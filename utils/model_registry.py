@@ -0,0 +1,237 @@
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+from utils.feature_engine import FEATURE_SIZE
+from utils.model_handler import ModelHandler, file_fingerprint
+
+BUNDLE_FILES = ['model.pkl', 'scaler.pkl', 'feature_manifest.json', 'cascade_model.pkl', 'cascade_scaler.pkl']
+
+
+def _write_text(path, text):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """Versioned model bundles under root/<version>/ (model.pkl, scaler.pkl, compiled/,
+    feature_manifest.json, metadata.json). root/CURRENT names the version to serve and
+    root/SHADOW an optional candidate scored on sampled traffic.
+    """
+
+    def __init__(self, root='models/registry'):
+        self.root = root
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isdir(self.version_dir(name)) and not name.startswith('.'))
+
+    def version_dir(self, version):
+        return os.path.join(self.root, version)
+
+    def exists(self, version):
+        return bool(version) and '/' not in version and not version.startswith('.') \
+            and os.path.isdir(self.version_dir(version))
+
+    def metadata(self, version):
+        try:
+            with open(os.path.join(self.version_dir(version), 'metadata.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def current_version(self):
+        return self._read_pointer('CURRENT')
+
+    def shadow_version(self):
+        return self._read_pointer('SHADOW')
+
+    def set_current(self, version):
+        """Points CURRENT at version. Every serving process picks the change up on its next poll."""
+        if not self.exists(version):
+            raise Exception(f"Unknown model version: {version}")
+        _write_text(os.path.join(self.root, 'CURRENT'), version)
+
+    def set_shadow(self, version):
+        """Sets (or with None clears) the candidate version for shadow scoring."""
+        path = os.path.join(self.root, 'SHADOW')
+        if version is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        if not self.exists(version):
+            raise Exception(f"Unknown model version: {version}")
+        _write_text(path, version)
+
+    def publish(self, source_dir='models', version=None, metadata=None):
+        """Copies the model artifacts in source_dir into a new version directory and returns its name."""
+        version = version or time.strftime('%Y%m%d-%H%M%S')
+        target = self.version_dir(version)
+        if os.path.exists(target):
+            raise Exception(f"Model version already exists: {version}")
+
+        # Assemble in a hidden directory and rename, so pollers never see half a bundle
+        staging = os.path.join(self.root, f".{version}.{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            for name in BUNDLE_FILES:
+                path = os.path.join(source_dir, name)
+                if os.path.exists(path):
+                    shutil.copy2(path, staging)
+            compiled_dir = os.path.join(source_dir, 'compiled')
+            if os.path.isdir(compiled_dir):
+                shutil.copytree(compiled_dir, os.path.join(staging, 'compiled'))
+
+            fingerprint = file_fingerprint([os.path.join(staging, 'model.pkl'), os.path.join(staging, 'scaler.pkl')])
+            meta = dict(metadata or {}, version=version, fingerprint=fingerprint,
+                        created_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+            with open(os.path.join(staging, 'metadata.json'), 'w') as f:
+                json.dump(meta, f, indent=2)
+            os.rename(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return version
+
+    def load(self, version, mmap_mode='r'):
+        directory = self.version_dir(version)
+        handler = ModelHandler(model_path=os.path.join(directory, 'model.pkl'),
+                               scaler_path=os.path.join(directory, 'scaler.pkl'),
+                               mmap_mode=mmap_mode)
+        handler.version = version
+        return handler
+
+    def _read_pointer(self, name):
+        try:
+            with open(os.path.join(self.root, name), 'r') as f:
+                version = f.read().strip()
+        except OSError:
+            return None
+        return version if self.exists(version) else None
+
+
+class ModelManager:
+    """Serves the registry's CURRENT version and swaps in new ones without dropping requests.
+    A change of CURRENT is noticed on the first request after poll_interval; the new version is
+    loaded and warmed up on a background thread while the old one keeps serving, then swapped in
+    with a single reference assignment. Requests hold on to the handler they started with.
+    """
+
+    def __init__(self, registry, model_path='models/model.pkl', scaler_path='models/scaler.pkl',
+                 mmap_mode='r', poll_interval=5.0, shadow_sample_rate=0.0):
+        self.registry = registry
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.mmap_mode = mmap_mode
+        self.poll_interval = poll_interval
+        self.shadow_sample_rate = shadow_sample_rate
+        self.shadow = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._loading = set()
+        self._failed = set()
+        self._last_poll = time.monotonic()
+
+        version = registry.current_version()
+        if version:
+            self._active = registry.load(version, mmap_mode=mmap_mode)
+        else:
+            # No registry yet: serve the loose files in models/ as before
+            self._active = ModelHandler(model_path=model_path, scaler_path=scaler_path, mmap_mode=mmap_mode)
+            self._active.version = 'legacy'
+
+        # Loaded synchronously too: under preload_app a loader thread would not survive the fork
+        shadow_version = registry.shadow_version() if shadow_sample_rate > 0 else None
+        if shadow_version:
+            try:
+                self.reload(shadow_version, shadow=True)
+            except Exception as e:
+                self.last_error = f"Loading model version {shadow_version} failed: {str(e)}"
+                self._failed.add((shadow_version, True))
+
+    @property
+    def active(self):
+        """The handler to use for one request; also triggers the cheap CURRENT/SHADOW poll."""
+        self._poll()
+        return self._active
+
+    def reload_async(self, version, shadow=False):
+        """Loads version on a background thread and swaps it in once warmed up."""
+        with self._lock:
+            if (version, shadow) in self._loading:
+                return
+            self._loading.add((version, shadow))
+            self._failed.discard((version, shadow))
+        threading.Thread(target=self._load_and_swap, args=(version, shadow), daemon=True).start()
+
+    def reload(self, version, shadow=False):
+        """Synchronous variant of reload_async; raises if the version cannot be loaded."""
+        handler = self.registry.load(version, mmap_mode=self.mmap_mode)
+        self._warm_up(handler)
+        if shadow:
+            self.shadow = handler
+        else:
+            self._active = handler
+        return handler
+
+    def should_shadow(self):
+        return self.shadow is not None and random.random() < self.shadow_sample_rate
+
+    def status(self):
+        return {
+            "active_version": self._active.version,
+            "shadow_version": self.shadow.version if self.shadow is not None else None,
+            "shadow_sample_rate": self.shadow_sample_rate,
+            "registry_current": self.registry.current_version(),
+            "loading": sorted(version for version, _ in self._loading),
+            "last_error": self.last_error
+        }
+
+    def _poll(self):
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+
+        version = self.registry.current_version()
+        if version and version != self._active.version and (version, False) not in self._failed:
+            self.reload_async(version)
+
+        if self.shadow_sample_rate > 0:
+            shadow_version = self.registry.shadow_version()
+            if shadow_version is None:
+                self.shadow = None
+            elif (self.shadow is None or shadow_version != self.shadow.version) \
+                    and (shadow_version, True) not in self._failed:
+                self.reload_async(shadow_version, shadow=True)
+
+    def _load_and_swap(self, version, shadow):
+        try:
+            self.reload(version, shadow=shadow)
+            print(f"Model version {version} is now {'shadowing' if shadow else 'serving'} (pid {os.getpid()})")
+        except Exception as e:
+            # Keep serving the previous version; retry only when explicitly requested
+            self.last_error = f"Loading model version {version} failed: {str(e)}"
+            print(self.last_error)
+            with self._lock:
+                self._failed.add((version, shadow))
+        finally:
+            with self._lock:
+                self._loading.discard((version, shadow))
+
+    def _warm_up(self, handler):
+        """Runs a few inferences so the first real request doesn't pay for page faults and lazy init."""
+        if not handler.is_loaded:
+            raise Exception("Model or Scaler not loaded")
+        rows = np.random.default_rng(0).normal(size=(8, FEATURE_SIZE)).astype(np.float32)
+        _, error = handler.predict_batch(rows)
+        if error:
+            raise Exception(error)
@@ -0,0 +1,117 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+_SAFE_ID = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class ProfileStore:
+    """Captures cProfile profiles of single requests into a bounded directory.
+    Each capture is <request_id>.prof (load with pstats or snakeviz) plus <request_id>.json with
+    the clip metadata and the top functions by cumulative time; the oldest captures are deleted
+    beyond max_captures. When a request is not selected the only cost is should_profile().
+    """
+
+    def __init__(self, directory='profiles', max_captures=50, sample_rate=0.0, top_functions=30):
+        self.directory = directory
+        self.max_captures = max_captures
+        self.sample_rate = sample_rate
+        self.top_functions = top_functions
+        # cProfile only sees the thread that enables it, and only one profiler may be active at a time
+        self._active = threading.Lock()
+
+    def should_profile(self, forced=False):
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def request_id(self, header_value=None):
+        request_id = _SAFE_ID.sub('', header_value or '')[:64].lstrip('.')
+        return request_id or uuid.uuid4().hex
+
+    @contextmanager
+    def capture(self, request_id, trigger):
+        """Profiles the enclosed block. Yields a dict the caller can fill with clip metadata, or None
+        if another capture is running in this process (the request then runs unprofiled).
+        """
+        if not self._active.acquire(blocking=False):
+            yield None
+            return
+
+        metadata = {"request_id": request_id, "trigger": trigger, "pid": os.getpid(),
+                    "created_at": time.strftime('%Y-%m-%dT%H:%M:%S')}
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                yield metadata
+            finally:
+                # Failed requests are saved too; they are often the slow ones
+                profile.disable()
+                metadata["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                self._save(profile, metadata)
+        finally:
+            self._active.release()
+
+    def list(self, limit=50):
+        """Metadata of the most recent captures, newest first."""
+        captures = []
+        for path in self._metadata_paths()[:limit]:
+            try:
+                with open(path, 'r') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            metadata.pop("top_functions", None)
+            captures.append(metadata)
+        return captures
+
+    def get(self, request_id):
+        """(metadata, path of the .prof file) for one capture, or (None, None)."""
+        request_id = self.request_id(request_id)
+        try:
+            with open(os.path.join(self.directory, f"{request_id}.json"), 'r') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        return metadata, os.path.join(self.directory, f"{request_id}.prof")
+
+    def _save(self, profile, metadata):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, metadata["request_id"])
+            profile.dump_stats(f"{base}.prof")
+
+            summary = io.StringIO()
+            stats = pstats.Stats(profile, stream=summary)
+            stats.sort_stats('cumulative').print_stats(self.top_functions)
+            metadata["top_functions"] = summary.getvalue()
+            with open(f"{base}.json", 'w') as f:
+                json.dump(metadata, f, indent=2)
+            self._rotate()
+        except Exception as e:
+            # A failed capture must never fail the request it profiled
+            print(f"Saving profile {metadata['request_id']} failed: {str(e)}")
+
+    def _metadata_paths(self):
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        except OSError:
+            return []
+        paths = [os.path.join(self.directory, name) for name in names]
+        return sorted(paths, key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0, reverse=True)
+
+    def _rotate(self):
+        for path in self._metadata_paths()[self.max_captures:]:
+            for stale in (path, path[:-len('.json')] + '.prof'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+class ResultCache:
+    """Content-addressed cache of detection results.
+    Keys combine a hash of the uploaded audio bytes with the fingerprint of the loaded model,
+    so a new model never sees results produced by the previous one.
+    The disk tier is shared by workers that may briefly (or, after a failed load, lastingly) serve
+    different models, so a fingerprint directory is only removed once nobody has written to it for
+    disk_max_age seconds.
+    """
+
+    def __init__(self, max_entries=1024, disk_dir=None, disk_max_age=3600):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_age = disk_max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_fingerprint = None
+        self._last_sweep = 0.0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or bool(self.disk_dir)
+
+    def audio_key(self, audio_data):
+        return hashlib.sha256(audio_data).hexdigest()
+
+    def get(self, audio_key, model_fingerprint):
+        """Returns the cached result or None. Checks the in-process LRU first, then the disk tier."""
+        self._check_model(model_fingerprint)
+
+        with self._lock:
+            result = self._entries.get(audio_key)
+            if result is not None:
+                self._entries.move_to_end(audio_key)
+                return dict(result)
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(audio_key, model_fingerprint), 'r') as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._remember(audio_key, result)
+            return dict(result)
+
+        return None
+
+    def put(self, audio_key, model_fingerprint, result):
+        """Stores a successful result in both tiers."""
+        self._check_model(model_fingerprint)
+        self._remember(audio_key, dict(result))
+
+        if self.disk_dir:
+            path = self._disk_path(audio_key, model_fingerprint)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write then rename so other workers never read a partial file
+                tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(result, f)
+                os.replace(tmp_path, path)
+                # Marks the model's directory as in use for _sweep_disk
+                os.utime(os.path.join(self.disk_dir, model_fingerprint))
+            except OSError:
+                pass
+            self._sweep_disk(model_fingerprint)
+
+    def _remember(self, audio_key, result):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[audio_key] = result
+            self._entries.move_to_end(audio_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _check_model(self, model_fingerprint):
+        """Drops the in-process entries produced by a previously loaded model. The disk tier is keyed
+        by fingerprint already and is left to _sweep_disk.
+        """
+        if model_fingerprint == self._model_fingerprint:
+            return
+        with self._lock:
+            if model_fingerprint == self._model_fingerprint:
+                return
+            self._entries.clear()
+            self._model_fingerprint = model_fingerprint
+
+    def _sweep_disk(self, model_fingerprint):
+        """At most once per disk_max_age, removes fingerprint directories nobody wrote to for that long."""
+        now = time.time()
+        if now - self._last_sweep < self.disk_max_age:
+            return
+        self._last_sweep = now
+        try:
+            names = os.listdir(self.disk_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stale = name != model_fingerprint and now - os.path.getmtime(path) > self.disk_max_age
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _disk_path(self, audio_key, model_fingerprint):
+        return os.path.join(self.disk_dir, model_fingerprint, audio_key[:2], f"{audio_key}.json")
@@ -0,0 +1,111 @@
+import math
+import numpy as np
+
+# Bounds on the window geometry: longer windows buffer that much audio per request, and shorter
+# steps multiply the number of fully featurized windows
+MAX_WINDOW_SECONDS = 30.0
+MIN_STEP_SECONDS = 0.1
+
+
+def iter_windows(blocks, window_samples, step_samples):
+    """Re-slices a stream of blocks into fixed overlapping windows.
+    Only one window plus one block is buffered at a time. Mirrors train_smart_model.extract_chunks:
+    a recording shorter than one window still yields a single (short) window.
+    """
+    pending = np.zeros(0, dtype=np.float32)
+    start = 0
+    emitted = False
+    for block in blocks:
+        pending = np.concatenate([pending, block])
+        while len(pending) >= window_samples:
+            yield start, pending[:window_samples]
+            emitted = True
+            pending = pending[step_samples:]
+            start += step_samples
+
+    if not emitted and len(pending) > 0:
+        yield start, pending
+
+
+def window_samples(window, overlap, sr):
+    """(window_samples, step_samples) for a window and overlap in seconds, or ValueError if they
+    fall outside the bounds above.
+    """
+    if not (math.isfinite(window) and math.isfinite(overlap)):
+        raise ValueError("window and overlap must be finite numbers")
+    if not MIN_STEP_SECONDS <= window <= MAX_WINDOW_SECONDS:
+        raise ValueError(f"window must be between {MIN_STEP_SECONDS:g} and {MAX_WINDOW_SECONDS:g} seconds")
+    window_length = int(window * sr)
+    step = window_length - int(overlap * sr)
+    if overlap < 0 or step < int(MIN_STEP_SECONDS * sr):
+        raise ValueError(f"overlap must be in [0, window - {MIN_STEP_SECONDS:g}] seconds")
+    return window_length, step
+
+
+class SegmentScorer:
+    """Scores long recordings window by window with flat peak memory."""
+
+    def __init__(self, processor, model_handler, window=1.0, overlap=0.5, batch_size=32):
+        self.window_samples, self.step_samples = window_samples(window, overlap, processor.sample_rate)
+        self.processor = processor
+        self.model_handler = model_handler
+        self.window = window
+        self.overlap = overlap
+        self.batch_size = batch_size
+
+    def score(self, source, on_batch=None):
+        """Returns per-segment timestamps and scores plus an aggregate verdict.
+        on_batch is called after every scored batch and may raise to stop early.
+        """
+        sr = self.processor.sample_rate
+        segments = []
+        rows = []
+        spans = []
+        families = self.model_handler.feature_families
+        for start, window in iter_windows(self.processor.stream_blocks(source), self.window_samples, self.step_samples):
+            rows.append(self.processor.extract_features_from_array(window, sr, families)[0])
+            spans.append((start, start + len(window)))
+            # Score in small batches so the feature rows never accumulate either
+            if len(rows) >= self.batch_size:
+                segments.extend(self._score_rows(rows, spans, sr))
+                rows, spans = [], []
+                if on_batch is not None:
+                    on_batch()
+        if rows:
+            segments.extend(self._score_rows(rows, spans, sr))
+
+        if not segments:
+            raise Exception("Audio processing error: no audio samples decoded")
+
+        return {
+            **self._aggregate(segments),
+            "window": self.window,
+            "overlap": self.overlap,
+            "segments": segments
+        }
+
+    def _score_rows(self, rows, spans, sr):
+        probabilities, error = self.model_handler.ai_probabilities(np.vstack(rows))
+        if error:
+            raise Exception(error)
+
+        return [{
+            "start": round(start / sr, 3),
+            "end": round(end / sr, 3),
+            "classification": "AI_GENERATED" if probability >= 0.5 else "HUMAN",
+            "ai_probability": round(float(probability), 4)
+        } for (start, end), probability in zip(spans, probabilities)]
+
+    def _aggregate(self, segments):
+        probabilities = np.array([segment["ai_probability"] for segment in segments])
+        mean_probability = float(np.mean(probabilities))
+        is_ai = mean_probability >= 0.5
+
+        return {
+            "classification": "AI_GENERATED" if is_ai else "HUMAN",
+            "confidence": round(mean_probability if is_ai else 1 - mean_probability, 2),
+            "ai_probability": round(mean_probability, 4),
+            "ai_segment_ratio": round(float(np.mean(probabilities >= 0.5)), 4),
+            "analyzed_duration": segments[-1]["end"],
+            "segment_count": len(segments)
+        }
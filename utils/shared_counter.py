@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+
+
+class SharedCounter:
+    """A count shared by all gunicorn workers, kept per process id so that the master can drop the
+    share of a worker that died without cleaning up (see child_exit in gunicorn.conf.py).
+    Must be created before the workers fork, i.e. at import time under preload_app.
+    """
+
+    def __init__(self, slots=256):
+        # pid of the process owning each slot (0 = free) and its current count
+        self._pids = multiprocessing.Array('i', slots)
+        self._counts = multiprocessing.Array('i', slots, lock=False)
+
+    def get_lock(self):
+        """The (reentrant) lock guarding the counter, for callers that check more than the limit."""
+        return self._pids.get_lock()
+
+    @property
+    def value(self):
+        with self._pids.get_lock():
+            return sum(self._counts)
+
+    def try_increment(self, limit=0):
+        """Adds one for this process unless the total is already at limit (0 = no limit)."""
+        with self._pids.get_lock():
+            if limit and sum(self._counts) >= limit:
+                return False
+            slot = self._slot(os.getpid(), create=True)
+            if slot is not None:
+                self._counts[slot] += 1
+            return True
+
+    def decrement(self):
+        with self._pids.get_lock():
+            slot = self._slot(os.getpid(), create=False)
+            if slot is not None and self._counts[slot] > 0:
+                self._counts[slot] -= 1
+                if self._counts[slot] == 0:
+                    self._pids[slot] = 0
+
+    def release_pid(self, pid):
+        """Drops everything counted by pid; returns how much that was."""
+        with self._pids.get_lock():
+            slot = self._slot(pid, create=False)
+            if slot is None:
+                return 0
+            released = self._counts[slot]
+            self._counts[slot] = 0
+            self._pids[slot] = 0
+            return released
+
+    def _slot(self, pid, create):
+        """Called with the lock held. With every slot taken, the count goes untracked rather than blocking."""
+        free = None
+        for index, owner in enumerate(self._pids):
+            if owner == pid:
+                return index
+            if owner == 0 and free is None:
+                free = index
+        if create and free is not None:
+            self._pids[free] = pid
+            return free
+        return None